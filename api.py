@@ -0,0 +1,148 @@
+"""
+Data Grouper Library API
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains code for using the grouping operations of grouper.py
+from other programs. Unlike grouper.py, nothing here opens dialogs,
+imports tkinter or changes the working directory: data files are given
+as paths or open buffers and the results are returned as data frames,
+so that tasks can be chained in memory. For example:
+
+    recall = api.run_task('FaceLearning-Recall', recall_files,
+                          recall_responses='RecallResponses/')
+    learning = api.run_task('FaceLearning-Learning', learning_files)
+    results = api.run_task('FaceLearning', recall=recall,
+                           learning=learning)
+
+============================
+
+"""
+import glob
+from os import path
+import pandas as pd
+import cache
+import processing
+import utils
+
+
+def run_task(task, inputs=(), cols=None, sort_cols=None, get_block=None,
+             blocks=None, recall_responses=None, recall=None, learning=None,
+             use_cache=False, cache_dir=None):
+    """ Group the data files of a task and return the result data frames.
+
+    :param task: name of the task, e.g. 'ActionValue' or 'FaceLearning'
+    :param inputs: list of paths or open buffers of the excel data files.
+        For the FaceLearning task these are the recall and learning output
+        excels, in that order, unless recall and learning are given
+    :param cols: columns kept from each file, defaulting to those of the
+        task
+    :param sort_cols: columns ordering the rows, defaulting to those of the
+        task
+    :param get_block: whether block numbers are parsed from the file names,
+        defaulting to the setting of the task
+    :param blocks: block numbers of the inputs, in the same order, for
+        inputs whose names do not contain them, such as unnamed buffers
+    :param recall_responses: the typed recall responses needed by the
+        FaceLearning-Recall task, as a directory path or a data frame
+    :param recall: results of the FaceLearning-Recall task, either as
+        returned by run_task or as its 'All Data' data frame
+    :param learning: results of the FaceLearning-Learning task, either as
+        returned by run_task or as its 'All Data' data frame
+    :param use_cache: whether the results of a previous run over unchanged
+        input files are reused, which requires all inputs, including the
+        recall responses, to be paths
+    :param cache_dir: directory of the result cache
+    :return: a dict of the result data frames by sheet name
+    """
+    if task == 'FaceLearning':
+        return run_facelearning(inputs, recall, learning)
+
+    [_, task_cols, task_sort_cols, task_get_block] = \
+        processing.get_task_config(task)
+    cols = task_cols if cols is None else list(cols)
+    sort_cols = task_sort_cols if sort_cols is None else list(sort_cols)
+    get_block = task_get_block if get_block is None else get_block
+    if not cols:
+        raise ValueError('No columns given for task ' + task)
+    inputs = list(inputs)
+    blocks = [None] * len(inputs) if blocks is None else list(blocks)
+    if len(blocks) != len(inputs):
+        raise ValueError('The number of blocks does not match the number '
+                         'of inputs.')
+
+    # recall in face learning task also needs the typed responses
+    recall_df = None
+    input_paths = list(inputs)
+    if task == 'FaceLearning-Recall':
+        if recall_responses is None:
+            raise ValueError('The FaceLearning-Recall task requires the '
+                             'typed recall responses.')
+        if isinstance(recall_responses, pd.DataFrame):
+            recall_df = recall_responses
+            use_cache = False
+        else:
+            input_paths += glob.glob(path.join(recall_responses, '*.xlsx'))
+
+    # reuse the results of a previous run over unchanged input files
+    cache_key = None
+    if use_cache and all(isinstance(input_path, str)
+                         for input_path in input_paths):
+        result_cache = cache.ResultCache(cache_dir)
+        cache_key = cache.make_key(input_paths, {
+            'task': task, 'cols': cols, 'sort_cols': sort_cols,
+            'get_block': get_block, 'blocks': blocks})
+        results = result_cache.load_frames(cache_key)
+        if results is not None:
+            return results
+
+    frames = [processing.process_file(file_name, cols, get_block, sort_cols,
+                                      block)
+              for file_name, block in zip(inputs, blocks)]
+    if task == 'FaceLearning-Recall' and recall_df is None:
+        recall_df = processing.read_recall_responses(recall_responses)
+    [all_data_df, reversals_df, winshifts_df, winshifts_avg_df] = \
+        processing.group_frames(frames, task, sort_cols, recall_df)
+
+    results = {'All Data': all_data_df}
+    if task == 'ActionValue' or task == 'Prob_RL':
+        results['Reversals'] = reversals_df
+        results['Winshifts'] = winshifts_df
+        results['Avg Winshifts'] = winshifts_avg_df
+
+    if cache_key is not None:
+        result_cache.store_frames(cache_key, results)
+
+    return results
+
+
+def run_facelearning(inputs=(), recall=None, learning=None):
+    """ Calculate the face learning measures from the recall and learning
+    results, given in memory or as paths or buffers of their output excels.
+
+    :return: a dict of the result data frames by sheet name
+    """
+    if recall is None or learning is None:
+        if len(inputs) != 2:
+            raise ValueError('The FaceLearning task requires the recall and '
+                             'learning results.')
+        recall_df, learning_df = [pd.read_excel(file_name)
+                                  for file_name in inputs]
+    else:
+        # accept either the results of run_task or their all data frames
+        recall_df = recall['All Data'] if isinstance(recall, dict) \
+            else recall
+        learning_df = learning['All Data'] if isinstance(learning, dict) \
+            else learning
+
+    all_data_df = utils.merge_facelearning_frames(recall_df, learning_df)
+    [summary_df, plot_df] = utils.calculate_facelearning_measures(
+        all_data_df)
+
+    return {'All Data': all_data_df, 'Analysis': summary_df,
+            'Means': plot_df}
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,164 @@
+"""
+Data Grouper Result Cache
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains code for caching the results of grouper.py so that
+a run over unchanged inputs returns the previously produced results
+instead of recomputing them.
+
+Results are keyed by a hash of the input file manifest (paths, sizes
+and modification times), the task definition and the version of the
+code. Cached entries are evicted once they are older than a maximum
+age, and the oldest entries are evicted while the cache is larger
+than its maximum size.
+
+============================
+
+"""
+import glob
+import hashlib
+import json
+import shutil
+import time
+from os import getpid, makedirs, path, remove, replace, utime
+import pandas as pd
+import prefetch
+
+
+# default location of the result cache
+CACHE_DIR = path.join(path.expanduser('~'), '.cache', 'datagrouper')
+
+
+def code_version():
+    """ Determine a hash of the source code of the program, so that results
+    produced by a different version of the code are not reused """
+    code_hash = hashlib.sha256()
+    for file_name in sorted(glob.glob(path.join(
+            path.dirname(path.abspath(__file__)), '*.py'))):
+        with open(file_name, 'rb') as source_file:
+            code_hash.update(source_file.read())
+
+    return code_hash.hexdigest()
+
+
+def make_key(file_paths, task_config, manifest=None):
+    """ Determine the cache key of a run from its input files and task
+    definition.
+
+    :param file_paths: list of paths of all input files of the run
+    :param task_config: dict describing the task, e.g. its name, columns,
+        sort columns and options
+    :param manifest: optional directory manifest, whose recorded sizes and
+        modification times are used for its files instead of stat calls
+    :return: a hex digest identifying the run
+    """
+    file_stats = []
+    for file_path in sorted(path.abspath(file_path)
+                            for file_path in file_paths):
+        entry = manifest.entry(file_path) if manifest else None
+        if entry:
+            file_stats.append([file_path, entry['size'], entry['mtime']])
+        else:
+            file_stats.append([file_path, path.getsize(file_path),
+                               path.getmtime(file_path)])
+
+    key_data = json.dumps([file_stats, task_config, code_version()],
+                          sort_keys=True, default=str)
+
+    return hashlib.sha256(key_data.encode()).hexdigest()
+
+
+class ResultCache:
+    """ Store and retrieve the output workbooks and data frames of previous
+    runs, keyed by make_key """
+
+    def __init__(self, cache_dir=None, max_age_days=30, max_size_mb=500):
+
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_age = max_age_days * 24 * 60 * 60
+        self.max_size = max_size_mb * 2 ** 20
+
+    def entry_path(self, key, extension):
+        """ Path of the cached entry for the given key """
+        return path.join(self.cache_dir, key + extension)
+
+    def lookup(self, key, extension):
+        """ Return the path of a cached entry, marking it as recently used,
+        or None when there is no entry for the key """
+        entry_path = self.entry_path(key, extension)
+        if not path.isfile(entry_path):
+            return None
+        utime(entry_path)
+
+        return entry_path
+
+    def restore_workbook(self, key, output_filename, temp_dir=None):
+        """ Publish a cached output workbook to output_filename, returning
+        whether there was a cached workbook for the key """
+        entry_path = self.lookup(key, '.xlsx')
+        if entry_path is None:
+            return False
+        local_filename = prefetch.local_output_path(output_filename,
+                                                    temp_dir)
+        shutil.copyfile(entry_path, local_filename)
+        prefetch.publish_file(local_filename, output_filename)
+
+        return True
+
+    def temp_path(self, key, extension):
+        """ Path for writing an entry before it is renamed into place, so
+        that a concurrent run never reads a partially written entry """
+        return self.entry_path(key, extension) + '.tmp-{}'.format(getpid())
+
+    def store_workbook(self, key, local_filename):
+        """ Add an output workbook, written on local disk and not yet
+        published, to the cache """
+        makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.temp_path(key, '.xlsx')
+        shutil.copyfile(local_filename, temp_path)
+        replace(temp_path, self.entry_path(key, '.xlsx'))
+        self.evict()
+
+    def load_frames(self, key):
+        """ Return the cached dict of result data frames for the key, or None
+        when there is no entry for the key """
+        entry_path = self.lookup(key, '.pkl')
+        if entry_path is None:
+            return None
+
+        return pd.read_pickle(entry_path)
+
+    def store_frames(self, key, frames):
+        """ Add a dict of result data frames to the cache """
+        makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.temp_path(key, '.pkl')
+        pd.to_pickle(frames, temp_path)
+        replace(temp_path, self.entry_path(key, '.pkl'))
+        self.evict()
+
+    def evict(self):
+        """ Remove entries older than the maximum age, then the least
+        recently used entries until the cache fits its maximum size """
+        now = time.time()
+        entries = []
+        for entry_path in glob.glob(path.join(self.cache_dir, '*')):
+            used_time = path.getmtime(entry_path)
+            if now - used_time > self.max_age:
+                remove(entry_path)
+            else:
+                entries.append((used_time, path.getsize(entry_path),
+                                entry_path))
+
+        # remove the least recently used entries first
+        total_size = sum(entry[1] for entry in entries)
+        for used_time, size, entry_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            remove(entry_path)
+            total_size -= size
+
+
+if __name__ == '__main__':
+    pass
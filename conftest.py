@@ -0,0 +1,54 @@
+"""
+Data Grouper test fixtures
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains shared fixtures for the tests, creating small
+synthetic E-Prime exports for the reversal learning tasks.
+
+============================
+
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def write_actionvalue_file(file_path, subject, session, rng, num_trials=30):
+    """ Write a synthetic ActionValue export for one subject and session,
+    starting with six practice trials """
+    conditions = ['Practice'] * 6 + \
+        ['R{}'.format(trial // 10 + 1) for trial in range(num_trials - 1)] + \
+        [None]
+    num_rows = len(conditions)
+
+    pd.DataFrame({
+        'Subject': subject,
+        'Session': session,
+        'WinningAction[Trial]': rng.choice(['left', 'right'], num_rows),
+        'Proba': 0.8,
+        'WinLose': rng.choice(['win', 'lose'], num_rows),
+        'ActionMade': rng.choice(['left', 'right'], num_rows),
+        'Condition': conditions,
+        'Accuracy': rng.integers(0, 2, num_rows),
+        'RestCount': np.arange(num_rows)[::-1] - 6,
+        'Score[Trial]': rng.integers(0, 100, num_rows),
+    }).to_excel(file_path, index=False)
+
+
+@pytest.fixture
+def actionvalue_dir(tmp_path):
+    """ A data directory of ActionValue exports for 8 subjects in 2 sessions,
+    covering the control, sham and treatment groups """
+    rng = np.random.default_rng(0)
+    data_dir = tmp_path / 'ActionValue'
+    data_dir.mkdir()
+
+    for subject in [401, 402, 403, 751, 753, 752, 754, 756]:
+        for session in [1, 2]:
+            write_actionvalue_file(
+                data_dir / 'ActionValue-{}-{}.xlsx'.format(subject, session),
+                subject, session, rng)
+
+    return data_dir
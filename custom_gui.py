@@ -19,15 +19,25 @@ from tkinter import Tk, Label, Listbox, Button, Scrollbar, Frame, \
 
 class AskColumns:
 
-    def __init__(self, master, all_cols):
+    def __init__(self, master, all_cols, col_files=None, num_files=1):
 
         self.master = master
         self.master.deiconify()
         self.frame = Frame(self.master)
         self.all_cols = all_cols
 
+        # columns found in every file (intersection) are listed normally,
+        # columns missing from some files (union only) are greyed out
+        self.col_files = col_files or {}
+        self.num_files = num_files
+        self.common_cols = [col for col in all_cols
+                            if len(self.col_files.get(col, ())) >= num_files
+                            or col not in self.col_files]
+
         self.prompt = 'Please select which columns will be necessary for ' \
-                      'the output excel file.'
+                      'the output excel file. ' \
+                      '{} of {} columns are found in all {} files.'.format(
+                          len(self.common_cols), len(all_cols), num_files)
         self.label = Label(master, text=self.prompt,
                            width=35,
                            wraplength=150,
@@ -52,8 +62,14 @@ class AskColumns:
                                selectmode='multiple',
                                exportselection=0)
         # add column names to the list box
-        for col_name in self.all_cols:
-            self.listbox.insert(self.all_cols.index(col_name), col_name)
+        common_cols = set(self.common_cols)
+        for line, col_name in enumerate(self.all_cols):
+            if col_name in common_cols:
+                self.listbox.insert(line, col_name)
+            else:
+                self.listbox.insert(line, '{} ({}/{} files)'.format(
+                    col_name, len(self.col_files[col_name]), self.num_files))
+                self.listbox.itemconfig(line, fg='grey')
         self.listbox.pack(side='left', fill='y')
 
         # pack the listbox
@@ -126,8 +142,8 @@ def ask_columns(all_cols):
                       selectmode='multiple',
                       exportselection=0)
     # add column names to the list box
-    for col_name in all_cols:
-        listbox.insert(all_cols.index(col_name), col_name)
+    for line, col_name in enumerate(all_cols):
+        listbox.insert(line, col_name)
     listbox.pack(side='left', fill='y')
 
     # pack the listbox
@@ -20,26 +20,34 @@ utilities, but the current utilities available include:
 == mean
 
 """
-from os import chdir, path, sep
+from os import chdir, path, remove, sep
 
-import pandas as pd
 import utils
 import processing
+import preview
+import cache
+import manifest
+import prefetch
+import spill
 import inspect
 from tkinter import Tk, messagebox
 from custom_gui import AskColumns, AskProcessing
 import glob, time
-import platform
 
 
 def main():
     """ Main function for grouping and compiling data into a single excel """
     # initialize variables
-    trimmed_frames = []
+    all_data_df = None
+    reversals_df = winshifts_df = winshifts_avg_df = None
+    summary_df = plot_df = None
+    report = None
+
+    # parse the command line options
+    args = processing.parse_arguments()
 
     # get the directory prefix based on the system
-    prefix = 'D:/' if platform.system() == 'Windows' else \
-        '/media/synapt1x/SCHOOLUSB/'
+    prefix = processing.get_prefix()
 
     # locate the current directory and file location
     dirname = path.split(path.abspath("__file__"))
@@ -49,35 +57,53 @@ def main():
     root.withdraw()
 
     [data_dirpath, cols, sort_cols, task, get_block] = \
-        processing.determine_task(root, dirname, prefix)
+        processing.determine_task(root, dirname, prefix, args.task)
+
+    # face learning only merges two output excels, so there is nothing to
+    # sample or estimate in a preview
+    if task == 'FaceLearning' and args.preview:
+        print("Preview is not available for the FaceLearning task; running "
+              "in full.")
+        args.preview = False
 
     # change to data directory
     chdir(data_dirpath)
 
-    # Ask user to identify the output directory and create an excel writer
+    # Ask user to identify the output directory
     output_dirname = processing.get_directory(root, '../Output/', 'Please '
                                                                   'select '
                                                                   'the '
                                                                   'output '
                                                                   'directory')
     output_filename = output_dirname + sep + task + '-' + time.strftime(
-        "%d-%m-%y") + '.xlsx'
-    excel_writer = pd.ExcelWriter(output_filename, engine='xlsxwriter')
+        "%d-%m-%y") + ('-PREVIEW' if args.preview else '') + '.xlsx'
 
     # get list of functions available in the utils function
     available_funcs = inspect.getmembers(utils, inspect.isfunction)
 
-    #try:
-    if task == 'FaceLearning':
-        # first merge the learning and recall files
-        all_data_df = utils.merge_facelearning(data_dirpath)
+    # face learning only merges the recall and learning output excels
+    file_manifest = None
+    input_paths = [file_name for file_name in utils.FACELEARNING_OUTPUTS
+                   if path.isfile(file_name)]
+
+    if task != 'FaceLearning':
+        # index the data files in the data directory chosen, only
+        # re-parsing the names of files that changed since the last run
+        file_manifest = manifest.DirectoryManifest(data_dirpath,
+                                                   get_block).update()
+        all_files = file_manifest.files
+        input_paths = list(all_files)
 
-        [summary_df, plot_df] = utils.calculate_facelearning_measures(
-            all_data_df)
-    else:
+        # warn about files that would be counted twice
+        for files in file_manifest.duplicates():
+            messagebox.showwarning("Warning", "Duplicate data files "
+                                              "found: " + ", ".join(files))
+        for files in file_manifest.conflicts():
+            messagebox.showwarning("Warning", "Conflicting data files found "
+                                              "for the same subject, "
+                                              "session and block: " +
+                                   ", ".join(files))
 
-        # get a list of all data files in data directory chosen
-        all_files = glob.glob("*.xlsx")
         if not len(all_files):
             messagebox.showwarning("Warning", "No excel spreadsheets "
                                               "found. Please restart "
@@ -86,14 +112,12 @@ def main():
         # if columns have not been specified yet call process example to
         # get info
         if not cols:
-            # setup the excel file
-            excel = pd.ExcelFile(all_files[0])
-
-            # now read excel file data into a DataFrame
-            datafile = pd.read_excel(excel)
+            # index the header rows of every file to find available columns
+            col_files = processing.build_header_index(file_manifest,
+                                                      all_files)
             # assign cols
-            ask_columns_window = AskColumns(root,
-                                            list(datafile.columns.values))
+            ask_columns_window = AskColumns(root, list(col_files),
+                                            col_files, len(all_files))
             #cols = ask_columns_window.get_values()
             #cols = ask_columns(list(datafile.columns.values))
 
@@ -101,53 +125,130 @@ def main():
         print("Current columns to be captured from the excel files:\n")
         for col in cols: print(col)
 
-        # parse over all data files
-        for file_name in all_files:
-            # store the data frame after only selecting necessary columns
-            trimmed_frames.append(processing.process_file(file_name, cols,
-                                                get_block))
-
-        # concatenate the data frames into one and process it
-        output_df = pd.concat(trimmed_frames)
-
-        # recall in face learning task also needs names from the typed
-        # excel
-        if task == 'FaceLearning-Recall':
-            temp_path = prefix + 'MandanaResearch/OCD-FaceLearning' \
-                        '/RecallResponses/'
-            chdir(temp_path)
-
-            recall_cols = ['Subject', 'Block', 'Trial', 'Recall Choice',
-                           'Recog Choice']
-            file_name = glob.glob("*.xlsx")[0]
-            recall_df = processing.process_file(file_name, recall_cols,
-                                              False)
-            output_df = pd.merge(output_df, recall_df)
-
-        # ask user which operations are requested for processing
-        #chosen_operations = choose_operations(available_funcs)
-        chosen_operations = []
-
-        # process the overall dataframe
-        [all_data_df, reversals_df, winshifts_df, winshifts_avg_df] = \
-            processing.process_dataframe(output_df, task, sort_cols,
-                                 output_dirname, chosen_operations)
-
-    # format and save the output excel file
-    all_data_df.to_excel(excel_writer, index=False, sheet_name='All Data')
-    if task == 'ActionValue' or task == 'Prob_RL':
-        reversals_df.to_excel(excel_writer, index=False,
-                              sheet_name='Reversals')
-        winshifts_df.to_excel(excel_writer, index=False, header=True,
-                              sheet_name='Winshifts')
-        winshifts_avg_df.to_excel(excel_writer, index=True, header=True,
-                              sheet_name='Avg Winshifts')
-    if task == 'FaceLearning':
-        summary_df.to_excel(excel_writer, index=False,
-                            sheet_name='Analysis')
-        plot_df.to_excel(excel_writer, index=False,
-                            sheet_name='Means')
-    excel_writer.save()
+    # recall in face learning task also needs names from the typed excel
+    recall_dirpath = prefix + processing.RECALL_RESPONSES_DIR
+    if task == 'FaceLearning-Recall':
+        input_paths += glob.glob(recall_dirpath + '*.xlsx')
+
+    # return the previous output if nothing has changed since the last run
+    result_cache = cache.ResultCache(args.cache_dir)
+    cache_key = cache.make_key(input_paths, {
+        'task': task, 'cols': cols, 'sort_cols': sort_cols,
+        'get_block': get_block}, file_manifest)
+    if not args.preview and not args.no_cache and \
+            result_cache.restore_workbook(cache_key, output_filename,
+                                          args.temp_dir):
+        print("Inputs are unchanged since the last run; output restored "
+              "from the result cache to " + output_filename)
+        return
+
+    # the output file is written to local disk first and moved to the
+    # output directory once complete
+    local_filename = prefetch.local_output_path(output_filename,
+                                                args.temp_dir)
+    constant_memory = False
+
+    prefetcher = spiller = None
+    try:
+        if task == 'FaceLearning':
+            excel_writer = processing.open_excel_writer(local_filename)
+
+            # first merge the learning and recall files
+            all_data_df = utils.merge_facelearning(data_dirpath)
+
+            [summary_df, plot_df] = utils.calculate_facelearning_measures(
+                all_data_df)
+        else:
+
+            # in preview mode only a stratified sample of files is processed
+            num_files = len(all_files)
+            if args.preview:
+                all_files = preview.sample_files(all_files, task, get_block,
+                                                 args.per_group, file_manifest)
+            report = preview.PreviewReport(len(all_files), num_files)
+
+            # parse over all data files, spilling them to disk once they
+            # exceed the memory budget
+            spiller = spill.FrameSpiller(args.memory_budget, args.temp_dir)
+
+            # read upcoming files ahead while earlier files are being parsed
+            prefetcher = prefetch.Prefetcher(all_files, args.prefetch,
+                                             args.staging_dir)
+            for file_name, source in prefetcher:
+                # store the data frame after only selecting necessary columns
+                # and ordering its rows by the sort columns
+                trimmed_df = report.time_stage(
+                    'Read files', processing.process_file, source, cols,
+                    get_block, sort_cols, file_manifest.entries[file_name][
+                        'block'])
+                report.add_frame(trimmed_df)
+                spiller.append(trimmed_df, sort_cols)
+            prefetcher.close()
+            report.add_io(prefetcher.read_seconds, prefetcher.wait_seconds)
+
+            # read the typed recall responses for the recall task
+            recall_df = None
+            if task == 'FaceLearning-Recall':
+                recall_df = processing.read_recall_responses(recall_dirpath)
+
+            # ask user which operations are requested for processing
+            #chosen_operations = choose_operations(available_funcs)
+            chosen_operations = []
+
+            # once data has been spilled, the writer must not keep the
+            # written rows in memory either
+            constant_memory = spiller.spilled
+            excel_writer = processing.open_excel_writer(local_filename,
+                                                        constant_memory)
+
+            if spiller.spilled:
+                # process the spilled data in chunks, writing the all data
+                # sheet as each chunk is completed
+                all_data_df = None
+                [reversals_df, winshifts_df, winshifts_avg_df] = \
+                    report.time_stage('Process', processing.process_chunks,
+                                      spiller.iter_chunks(sort_cols), task,
+                                      sort_cols, output_dirname,
+                                      chosen_operations, excel_writer,
+                                      recall_df)
+            else:
+                # concatenate the data frames in order and process them
+                [all_data_df, reversals_df, winshifts_df, winshifts_avg_df] = \
+                    report.time_stage('Process', processing.group_frames,
+                                      spiller.frames, task, sort_cols,
+                                      recall_df)
+            spiller.close()
+
+        # format and save the output excel file
+        write_start = time.perf_counter()
+        processing.write_result_sheets(excel_writer, task, all_data_df,
+                                       reversals_df, winshifts_df,
+                                       winshifts_avg_df, summary_df, plot_df,
+                                       constant_memory)
+        if args.preview and report:
+            report.stage_times['Write sheets'] = \
+                time.perf_counter() - write_start
+            report_df = report.to_dataframe()
+            processing.write_sheet(excel_writer, 'Preview', report_df,
+                                   constant_memory=constant_memory)
+            print(report_df.to_string(index=False))
+        excel_writer.close()
+
+        # keep the output for later runs over the same inputs
+        if not args.preview and not args.no_cache:
+            result_cache.store_workbook(cache_key, local_filename)
+        prefetch.publish_file(local_filename, output_filename)
+        if report:
+            print(report.io_summary())
+    finally:
+        # always stop reading ahead and remove the temp and local files,
+        # even if grouping failed
+        if prefetcher is not None:
+            prefetcher.close()
+        if spiller is not None:
+            spiller.close()
+        if path.isfile(local_filename):
+            remove(local_filename)
 
     '''except ValueError:
         messagebox.showwarning('Warning', 'No Excel files found in data '
@@ -0,0 +1,229 @@
+"""
+Data Grouper Directory Manifest
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains code for indexing the excel files of a data
+directory. The manifest records the size, modification time, header
+columns and the subject, session and block of every file, parsed from
+its name or, for the subject, read from its first row when the name does
+not give it. The manifest is stored in the data directory so that later
+runs only re-read the files whose size or modification time changed.
+
+The manifest is also used to detect duplicate files, which have the same
+contents, and conflicting files, which are named for the same subject,
+session and block but have different contents. Contents are only hashed
+for files that could be duplicates or conflicts, i.e. files of the same
+size or named for the same subject, session and block.
+
+============================
+
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+import processing
+
+
+# name of the file used to store the manifest inside a data directory
+MANIFEST_NAME = '.datagrouper-manifest.json'
+
+
+def parse_file_name(file_name, get_block=False):
+    """ Parse the subject, session and block numbers from the name of a data
+    file exported from E-Prime, e.g. 'ActionValue-401-1.xlsx' for subject 401
+    and session 1. The subject and session are left as None unless the name
+    follows the Task-Subject-Session pattern, as names such as
+    'ActionValue-401-1-2017.xlsx' do not say which number is the subject.
+    Names with a block number, e.g. 'FaceLearning-401-Block1_x.xlsx', give
+    the subject in the token before the block """
+    tokens = path.splitext(path.basename(file_name))[0].split(sep='-')
+
+    metadata = {'subject': None, 'session': None, 'block': None}
+    if len(tokens) >= 3 and tokens[-2].isdigit() and tokens[-1].isdigit() \
+            and not any(token.isdigit() for token in tokens[:-2]):
+        metadata['subject'], metadata['session'] = \
+            int(tokens[-2]), int(tokens[-1])
+
+    if get_block:
+        try:
+            metadata['block'] = processing.parse_block(file_name)
+        except (IndexError, ValueError):
+            pass
+        if metadata['block'] is not None and metadata['subject'] is None \
+                and tokens[1].isdigit():
+            metadata['subject'] = int(tokens[1])
+
+    return metadata
+
+
+def is_named(entry):
+    """ Determine whether a file is named for a subject and a session or
+    block, so that another file named for the same ones conflicts with it """
+    return entry['subject'] is not None and \
+        (entry['session'] is not None or entry['block'] is not None)
+
+
+def hash_file(file_path):
+    """ Determine the sha256 hash of the contents of a file """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as data_file:
+        for block in iter(lambda: data_file.read(2 ** 20), b''):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+class DirectoryManifest:
+    """ Index of the excel files in a data directory, updated incrementally
+    by comparing the size and modification time of each file """
+
+    def __init__(self, data_dirpath, get_block=False):
+
+        self.data_dirpath = path.abspath(data_dirpath)
+        self.manifest_path = path.join(self.data_dirpath, MANIFEST_NAME)
+        self.get_block = get_block
+
+        # load the manifest of a previous run, if any
+        try:
+            with open(self.manifest_path) as manifest_file:
+                self.entries = json.load(manifest_file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @property
+    def files(self):
+        """ Sorted names of all excel files in the data directory """
+        return sorted(self.entries)
+
+    def path(self, file_name):
+        """ Full path of a file in the data directory """
+        return path.join(self.data_dirpath, file_name)
+
+    def entry(self, file_path):
+        """ Return the manifest entry of a file, or None if the file is not
+        in the data directory """
+        if path.dirname(path.abspath(file_path)) != self.data_dirpath:
+            return None
+
+        return self.entries.get(path.basename(file_path))
+
+    def update(self):
+        """ Update the manifest from the data directory, parsing the names
+        of only the new or changed files, and return it. The subject of a
+        file whose name does not give it is read from its first row """
+        entries = {}
+        changed = False
+
+        # skip hidden files, such as the ._ files left by macOS on USB drives
+        for dir_entry in os.scandir(self.data_dirpath):
+            if dir_entry.name.startswith('.') or \
+                    not dir_entry.name.endswith('.xlsx') or \
+                    not dir_entry.is_file():
+                continue
+            stats = dir_entry.stat()
+            entry = self.entries.get(dir_entry.name)
+
+            if entry is None or entry['size'] != stats.st_size or \
+                    entry['mtime'] != stats.st_mtime or \
+                    entry['get_block'] != self.get_block:
+                entry = {'size': stats.st_size, 'mtime': stats.st_mtime,
+                         'hash': None, 'cols': None,
+                         'get_block': self.get_block}
+                entry.update(parse_file_name(dir_entry.name, self.get_block))
+                if entry['subject'] is None:
+                    try:
+                        entry['subject'] = processing.read_subject(
+                            dir_entry.path)
+                    except (IndexError, KeyError, ValueError):
+                        pass
+                changed = True
+            entries[dir_entry.name] = entry
+
+        changed = changed or len(entries) != len(self.entries)
+        self.entries = entries
+        if self.hash_candidates() or changed:
+            self.save()
+
+        return self
+
+    def hash_candidates(self):
+        """ Hash the contents of the files that could be duplicates or
+        conflicts and have not been hashed yet, returning whether any were """
+        candidates = {}
+        for file_name, entry in self.entries.items():
+            candidates.setdefault(('size', entry['size']),
+                                  []).append(file_name)
+            if is_named(entry):
+                candidates.setdefault(('name', entry['subject'],
+                                       entry['session'], entry['block']),
+                                      []).append(file_name)
+
+        hashed = False
+        for files in candidates.values():
+            if len(files) < 2:
+                continue
+            for file_name in files:
+                if self.entries[file_name].get('hash') is None:
+                    self.entries[file_name]['hash'] = \
+                        hash_file(self.path(file_name))
+                    hashed = True
+
+        return hashed
+
+    def read_headers(self, file_names):
+        """ Read the header columns of the given files in parallel, for only
+        those files whose columns are not in the manifest yet """
+        stale_files = [file_name for file_name in file_names
+                       if self.entries[file_name].get('cols') is None]
+        if not stale_files:
+            return
+
+        with ProcessPoolExecutor() as executor:
+            all_cols = executor.map(processing.read_header, [
+                self.path(file_name) for file_name in stale_files])
+            for file_name, cols in zip(stale_files, all_cols):
+                self.entries[file_name]['cols'] = cols
+        self.save()
+
+    def save(self):
+        """ Store the manifest in the data directory, replacing the previous
+        one in a single step and skipping read-only data directories """
+        temp_path = self.manifest_path + '.tmp-{}'.format(os.getpid())
+        try:
+            with open(temp_path, 'w') as manifest_file:
+                json.dump(self.entries, manifest_file)
+            os.replace(temp_path, self.manifest_path)
+        except OSError:
+            pass
+
+    def duplicates(self):
+        """ Groups of files that have the same contents """
+        hash_files = {}
+        for file_name in self.files:
+            file_hash = self.entries[file_name].get('hash')
+            if file_hash is not None:
+                hash_files.setdefault(file_hash, []).append(file_name)
+
+        return [files for files in hash_files.values() if len(files) > 1]
+
+    def conflicts(self):
+        """ Groups of files named for the same subject, session and block but
+        with different contents """
+        key_files = {}
+        for file_name in self.files:
+            entry = self.entries[file_name]
+            if is_named(entry):
+                key_files.setdefault((entry['subject'], entry['session'],
+                                      entry['block']), []).append(file_name)
+
+        return [files for files in key_files.values()
+                if len({self.entries[file_name]['hash']
+                        for file_name in files}) > 1]
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,141 @@
+"""
+Data Grouper Prefetch Functions
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains code for reading data files from slow media, such as
+a USB drive, while earlier files are being parsed. Upcoming files are
+read ahead by a background thread into memory buffers, or copied into a
+local staging directory, with a bounded number of files held at once.
+
+Output files are likewise written to local disk first and then moved
+into the target directory in a single step, so that a partially written
+output never appears there.
+
+============================
+
+"""
+import io
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from os import path
+
+
+class Prefetcher:
+    """ Read files ahead in a background thread, yielding each one as an
+    in-memory buffer or a locally staged copy in the original order """
+
+    def __init__(self, file_paths, max_buffered=4, staging_dir=None):
+
+        self.file_paths = list(file_paths)
+        self.queue = queue.Queue(maxsize=max(max_buffered, 1))
+        self.stop = threading.Event()
+
+        # stage copies in a temp directory when a staging dir is given
+        self.staging_dir = tempfile.mkdtemp(prefix='datagrouper-',
+                                            dir=staging_dir) \
+            if staging_dir else None
+
+        # total time spent reading in the background and waiting for it
+        self.read_seconds = 0
+        self.wait_seconds = 0
+
+        self.thread = threading.Thread(target=self.read_ahead, daemon=True)
+        self.thread.start()
+
+    @property
+    def saved_seconds(self):
+        """ Time spent reading that did not hold up the parsing of files """
+        return max(self.read_seconds - self.wait_seconds, 0)
+
+    def read_ahead(self):
+        """ Read each file in turn, blocking while the queue is full """
+        try:
+            for file_path in self.file_paths:
+                start = time.perf_counter()
+                if self.staging_dir:
+                    source = path.join(self.staging_dir,
+                                       path.basename(file_path))
+                    shutil.copyfile(file_path, source)
+                else:
+                    with open(file_path, 'rb') as data_file:
+                        source = io.BytesIO(data_file.read())
+                    source.name = file_path
+                self.read_seconds += time.perf_counter() - start
+
+                if not self.put((file_path, source)):
+                    return
+        except Exception as error:
+            self.put(error)
+            return
+        self.put(None)
+
+    def put(self, item):
+        """ Add an item to the queue, returning False if stopped first """
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def __iter__(self):
+        """ Yield (file path, buffer or staged path) for every file """
+        staged = None
+        while True:
+            start = time.perf_counter()
+            item = self.queue.get()
+            self.wait_seconds += time.perf_counter() - start
+
+            # remove the staged copy of the previous file once parsed
+            if staged:
+                os.remove(staged)
+                staged = None
+
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            if self.staging_dir:
+                staged = item[1]
+            yield item
+
+    def close(self):
+        """ Stop reading ahead and remove any staged copies """
+        self.stop.set()
+        self.thread.join()
+        if self.staging_dir:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+def local_output_path(output_filename, temp_dir=None):
+    """ Get a path on local disk for writing an output file before it is
+    published to output_filename """
+    file_handle, local_path = tempfile.mkstemp(
+        prefix='datagrouper-', suffix=path.splitext(output_filename)[1],
+        dir=temp_dir)
+    os.close(file_handle)
+
+    return local_path
+
+
+def publish_file(local_path, output_filename):
+    """ Move a file written on local disk to output_filename in a single
+    step, by copying it next to the target and renaming it into place """
+    temp_path = path.join(path.dirname(path.abspath(output_filename)),
+                          '.' + path.basename(output_filename) +
+                          '.tmp-{}'.format(os.getpid()))
+    shutil.copyfile(local_path, temp_path)
+    os.replace(temp_path, output_filename)
+    os.remove(local_path)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,141 @@
+"""
+Data Grouper Preview Functions
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains code for running a quick preview of a grouping
+operation in grouper.py. A preview only processes a stratified sample
+of the data files, a few from each group of subjects, and measures the
+time and memory used by each stage so that the cost of a full run over
+the whole data directory can be estimated before committing to it.
+
+============================
+
+"""
+import time
+import pandas as pd
+import utils
+import processing
+
+
+def sample_files(all_files, task, get_block=False, per_group=2,
+                 file_manifest=None):
+    """ Choose a stratified sample of the data files, taking up to per_group
+    files from each group of subjects.
+
+    :param all_files: list of all data file names
+    :param task: name of the task, used for assigning groups
+    :param get_block: whether the block number is part of the file names
+    :param per_group: maximum number of files sampled from each group
+    :param file_manifest: optional directory manifest, whose recorded
+        subjects and blocks are used instead of reading each file
+    :return: the list of sampled file names in their original order
+    """
+    group_files = {}
+
+    # assign each file to the group of the subject it contains
+    for file_name in all_files:
+        entry = file_manifest.entry(file_name) if file_manifest else None
+        if entry is not None:
+            subject_row = {'Subject': entry['subject'],
+                           'Block': entry['block']}
+        else:
+            subject_row = {'Subject': processing.read_subject(file_name)}
+            if get_block:
+                subject_row['Block'] = processing.parse_block(file_name)
+        group = utils.assign_group(subject_row, task=task)
+        group_files.setdefault(group, []).append(file_name)
+
+    # spread the sampled files evenly over each group
+    sampled = set()
+    for files in group_files.values():
+        step = max(len(files) / per_group, 1)
+        sampled.update(files[int(i * step)]
+                       for i in range(min(per_group, len(files))))
+
+    return [file_name for file_name in all_files if file_name in sampled]
+
+
+class PreviewReport:
+    """ Record the time and memory used by each stage of a grouping run on
+    a sample of files, and extrapolate them to the full set of files """
+
+    def __init__(self, num_sampled, num_total):
+
+        self.num_sampled = num_sampled
+        self.num_total = num_total
+        self.stage_times = {}
+        self.frame_bytes = 0
+
+        # time spent reading files ahead and waiting on those reads
+        self.io_read = 0
+        self.io_wait = 0
+
+    def time_stage(self, stage, func, *args, **kwargs):
+        """ Call func with the given arguments, adding the time taken to the
+        total for the given stage, and return its result """
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stage_times[stage] = self.stage_times.get(stage, 0) + \
+            time.perf_counter() - start
+
+        return result
+
+    def add_frame(self, df):
+        """ Record the memory used by a data frame read from a sampled
+        file """
+        self.frame_bytes += int(df.memory_usage(deep=True).sum())
+
+    def add_io(self, read_seconds, wait_seconds):
+        """ Record the time spent reading files ahead in the background and
+        the time parsing had to wait for those reads """
+        self.io_read += read_seconds
+        self.io_wait += wait_seconds
+
+    def io_summary(self):
+        """ Describe the I/O wait time saved by reading files ahead """
+        return 'Read {} files in {:.2f} s, waited {:.2f} s for reads; ' \
+               '{:.2f} s of I/O wait saved by prefetching'.format(
+                   self.num_sampled, self.io_read, self.io_wait,
+                   max(self.io_read - self.io_wait, 0))
+
+    def to_dataframe(self):
+        """ Summarize the measured and extrapolated costs as a data frame """
+        scale = self.num_total / max(self.num_sampled, 1)
+        rows = []
+
+        # every stage is assumed to grow linearly with the number of files
+        for stage, seconds in self.stage_times.items():
+            rows.append([stage + ' (s)', seconds,
+                         seconds / max(self.num_sampled, 1), seconds * scale])
+        total = sum(self.stage_times.values())
+        rows.append(['Total (s)', total, total / max(self.num_sampled, 1),
+                     total * scale])
+
+        # reading ahead overlaps the reads with the parsing of files
+        saved = max(self.io_read - self.io_wait, 0)
+        for measure, seconds in [('I/O read (s)', self.io_read),
+                                 ('I/O wait (s)', self.io_wait),
+                                 ('I/O wait saved (s)', saved)]:
+            rows.append([measure, seconds,
+                         seconds / max(self.num_sampled, 1),
+                         seconds * scale])
+
+        # concatenating the frames briefly holds two copies of the data
+        megabytes = 2 * self.frame_bytes / 2 ** 20
+        rows.append(['Peak memory (MB)', megabytes,
+                     megabytes / max(self.num_sampled, 1),
+                     megabytes * scale])
+
+        report_df = pd.DataFrame(rows, columns=['Measure', 'Preview',
+                                                'Per File',
+                                                'Estimated Full Run'])
+        report_df['Files'] = '{} of {}'.format(self.num_sampled,
+                                               self.num_total)
+
+        return report_df
+
+
+if __name__ == '__main__':
+    pass
@@ -13,14 +13,59 @@ either optional functionality or request information from the user.
 
 
 """
-import sys
+import argparse
+import glob
+import platform
+from os import path
 import pandas as pd
 import utils
-from tkinter import messagebox, filedialog
+
+
+# default data directory, relative to the drive prefix, columns, sort
+# columns and whether block numbers are parsed from file names for each task
+TASK_CONFIGS = {
+    'ActionValue': {
+        'data_dir': 'MandanaResearch/OCD-ReversalLearning'
+                    '/ReversalLearning-ExcelFiles/ActionValue/',
+        'cols': ['Subject', 'Session', 'WinningAction[Trial]', 'Proba',
+                 'WinLose', 'ActionMade', 'Condition', 'Accuracy',
+                 'RestCount', 'Score[Trial]'],
+        'sort_cols': ['Subject', 'Session'],
+        'get_block': False},
+    'Prob_RL': {
+        'data_dir': 'MandanaResearch/OCD-ReversalLearning'
+                    '/ReversalLearning-ExcelFiles/Prob_RL/',
+        'cols': ['Subject', 'Session', 'WinningColor[Trial]', 'Proba',
+                 'WinLose', 'ColorPicked', 'Condition', 'Accuracy',
+                 'RestCount', 'Score[Trial]'],
+        'sort_cols': ['Subject', 'Session'],
+        'get_block': False},
+    'FaceLearning-Learning': {
+        'data_dir': 'MandanaResearch/OCD-FaceLearning/FaceLearning-Learning/',
+        'cols': ['Subject', 'Block', 'Trial', 'TextDisplay6.RESP'],
+        'sort_cols': ['Subject', 'Block', 'Trial'],
+        'get_block': True},
+    'FaceLearning-Recall': {
+        'data_dir': 'MandanaResearch/OCD-FaceLearning/FaceLearning-Recall/',
+        'cols': ['Subject', 'Block', 'Trial', 'CorrectAnswer',
+                 'TextDisplay35.RESP', 'TextDisplay36.RESP'],
+        'sort_cols': ['Subject', 'Block', 'Trial'],
+        'get_block': True},
+    'FaceLearning': {
+        'data_dir': 'MandanaResearch/OCD-FaceLearning/Output/',
+        'cols': [],
+        'sort_cols': [],
+        'get_block': False},
+}
+
+# directory of the typed recall responses, relative to the drive prefix
+RECALL_RESPONSES_DIR = 'MandanaResearch/OCD-FaceLearning/RecallResponses/'
 
 
 def get_directory(root, initial_dir, title_dir):
     """ Ask the user for the appropriate directory """
+    from tkinter import messagebox, filedialog
+
     try:
         get_dirname = filedialog.askdirectory(
             parent=root, initialdir=initial_dir,
@@ -34,9 +79,12 @@ def get_directory(root, initial_dir, title_dir):
         exit()
 
 
-def process_file(file_name, cols, get_block=False):
+def process_file(file_name, cols, get_block=False, sort_cols=None,
+                 block=None):
     """ Parse an excel file and return a dataframe trimmed based on which 
-    columns are required for the given task """
+    columns are required for the given task, ordered by sort_cols if
+    given. The block number is parsed from the file name unless it was
+    already parsed, e.g. by the directory manifest """
 
     # setup the excel file
     excel = pd.ExcelFile(file_name)
@@ -46,99 +94,217 @@ def process_file(file_name, cols, get_block=False):
 
     # split name in the case of the face learning task
     if get_block:
-        text_split = file_name.split(sep='-')
-        block_num = text_split[2].split(sep='_')[0][-1]
-
         # add column for block num
-        datafile['Block'] = block_num
+        datafile['Block'] = parse_block(file_name) if block is None \
+            else block
         datafile['Block'] = datafile['Block'].astype(int)
 
+    if sort_cols:
+        return sort_file_frame(datafile[cols], sort_cols)
+
     return datafile[cols]
 
 
-def determine_task(root, dirname, prefix):
-    """ Determine which task will be amalgamated by grouper.py """
+def sort_file_frame(df, sort_cols):
+    """ Order the data frame of a single file by the sort columns. Files are
+    usually already in trial order, in which case they are returned as is """
+    if pd.MultiIndex.from_frame(df[sort_cols]).is_monotonic_increasing:
+        return df
+
+    return df.sort_values(sort_cols, kind='mergesort')
+
+
+def assemble_ordered(frames, sort_cols):
+    """ Concatenate data frames that are each already ordered by sort_cols
+    into one ordered data frame.
+
+    Frames are ordered by their first key, e.g. their (Subject, Session),
+    and concatenated in that order without sorting the whole frame. Only
+    runs of frames whose key ranges overlap are merged by sorting them
+    together.
+
+    :param frames: list of data frames, each ordered by sort_cols
+    :param sort_cols: list of columns identifying the order of the rows
+    :return: a single data frame ordered by sort_cols
+    """
+    # determine the key range covered by each frame
+    ranges = []
+    for df in frames:
+        if len(df):
+            keys = df[sort_cols]
+            ranges.append((tuple(keys.iloc[0]), tuple(keys.iloc[-1]), df))
+    if not ranges:
+        return pd.concat(frames)
+    ranges.sort(key=lambda key_range: key_range[0])
+
+    # collect consecutive frames into runs of overlapping key ranges
+    runs = [[ranges[0][2]]]
+    last_key = ranges[0][1]
+    for first, last, df in ranges[1:]:
+        if first < last_key:
+            runs[-1].append(df)
+        else:
+            runs.append([df])
+        last_key = max(last_key, last)
+
+    # merge each overlapping run, keeping the trial order within each key
+    ordered = [run[0] if len(run) == 1 else
+               pd.concat(run).sort_values(sort_cols, kind='mergesort')
+               for run in runs]
+
+    return pd.concat(ordered)
+
+
+def parse_block(file_name):
+    """ Determine the block number of a face learning file from its name, or
+    from the name of an open file """
+    file_name = getattr(file_name, 'name', file_name)
+    if not isinstance(file_name, str):
+        raise ValueError('The block number cannot be parsed from an unnamed '
+                         'buffer; give the block number or a buffer with a '
+                         'name attribute.')
+    text_split = path.basename(file_name).split(sep='-')
+
+    return int(text_split[2].split(sep='_')[0][-1])
+
+
+def read_subject(file_name):
+    """ Read only the first data row of an excel file and return the subject
+    number recorded in it """
+    datafile = pd.read_excel(file_name, nrows=1, usecols=['Subject'])
+
+    return int(datafile['Subject'].iloc[0])
+
+
+def parse_arguments(argv=None):
+    """ Parse the command line arguments given to grouper.py """
+    parser = argparse.ArgumentParser(description='Group the data files of a '
+                                                 'task into one excel file.')
+    parser.add_argument('task', nargs='?', default=None,
+                        help='name of the task to group; the data directory '
+                             'is requested when not given')
+    parser.add_argument('--preview', action='store_true',
+                        help='only process a stratified sample of the files '
+                             'and estimate the cost of a full run')
+    parser.add_argument('--per-group', type=int, default=2,
+                        help='number of files sampled per group in preview '
+                             'mode')
+    parser.add_argument('--memory-budget', type=float, default=None,
+                        metavar='MB',
+                        help='memory budget in megabytes, beyond which read '
+                             'data is spilled to temp files and processed '
+                             'in chunks')
+    parser.add_argument('--temp-dir', default=None,
+                        help='local directory for spilled temp files and '
+                             'the output file before it is moved to the '
+                             'output directory')
+    parser.add_argument('--prefetch', type=int, default=4, metavar='N',
+                        help='number of data files read ahead while '
+                             'earlier files are parsed')
+    parser.add_argument('--staging-dir', default=None,
+                        help='local directory to stage data files read '
+                             'ahead, instead of holding them in memory')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='recompute the output even if the inputs are '
+                             'unchanged since a previous run')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory of the result cache')
+    args = parser.parse_args(argv)
+
+    if args.per_group < 1:
+        parser.error('--per-group must be at least 1')
+
+    return args
+
+
+def read_header(file_name):
+    """ Read only the header row of an excel file and return its column
+    names """
+    return list(pd.read_excel(file_name, nrows=0).columns.values)
+
+
+def build_header_index(file_manifest, all_files):
+    """ Build an index of which files contain each column from the header
+    rows of all files, as recorded in the manifest of the data directory.
+
+    :param file_manifest: the manifest of the data directory, in which the
+        header rows of any new or changed files are read in parallel
+    :param all_files: list of data file names within the data directory
+    :return: a dict mapping each column name, in order of first appearance,
+        to the list of files that contain it
+    """
+    file_manifest.read_headers(all_files)
+
+    # record which files contain each column
+    col_files = {}
+    for file_name in all_files:
+        for col in file_manifest.entries[file_name]['cols']:
+            col_files.setdefault(col, []).append(file_name)
+
+    return col_files
+
+
+def get_prefix():
+    """ Get the drive prefix of the default data directories based on the
+    system """
+    return 'D:/' if platform.system() == 'Windows' else \
+        '/media/synapt1x/SCHOOLUSB/'
+
+
+def get_task_config(task, prefix=''):
+    """ Look up the default data directory, columns, sort columns and
+    whether block numbers are parsed from file names for a task, without
+    asking the user for anything """
+    if task not in TASK_CONFIGS:
+        return '', [], [], False
+    config = TASK_CONFIGS[task]
+
+    return prefix + config['data_dir'], list(config['cols']), \
+        list(config['sort_cols']), config['get_block']
+
+
+def determine_task(root, dirname, prefix, task=None):
+    """ Determine which task will be amalgamated by grouper.py, asking for
+    the data directory when no task was given on the command line """
+    from tkinter import messagebox
+
     # initialize
     data_dirpath = ''
-    cols = []
-    sort_cols = []
-    get_block = False
 
-    if len(sys.argv) > 1:
-        task = str(sys.argv[1])
-    else:
+    if not task:
         # Ask user to identify the data directory
         data_dirpath = get_directory(root, dirname, 'Please select the data '
                                                     'directory.')
         task = data_dirpath.split('/')[-1]
 
     # identify the columns required for each task
-    if task == 'ActionValue':
-        messagebox.showinfo('Default found for task',
-                            'Default settings loaded for this task.')
-        if not data_dirpath:
-            data_dirpath = prefix + \
-                'MandanaResearch/OCD-ReversalLearning' \
-                '/ReversalLearning-ExcelFiles/ActionValue/'
-        get_block = False
-
-        cols = ['Subject', 'Session', 'WinningAction[Trial]', 'Proba',
-                'WinLose', 'ActionMade', 'Condition', 'Accuracy',
-                'RestCount', 'Score[Trial]']
-
-        sort_cols = ['Subject', 'Session']
-
-    elif task == 'Prob_RL':
-        messagebox.showinfo('Default found for task',
-                            'Default settings loaded for this task.')
-        if not data_dirpath:
-            data_dirpath = prefix + \
-                'MandanaResearch/OCD-ReversalLearning' \
-                '/ReversalLearning-ExcelFiles/Prob_RL/'
-        get_block = False
-
-        cols = ['Subject', 'Session', 'WinningColor[Trial]', 'Proba',
-                'WinLose', 'ColorPicked', 'Condition', 'Accuracy',
-                'RestCount', 'Score[Trial]']
-
-        sort_cols = ['Subject', 'Session']
-
-    elif task == 'FaceLearning-Learning':
+    if task == 'FaceLearning':
+        messagebox.Message('Default found for task; default settings loaded')
+    elif task in TASK_CONFIGS:
         messagebox.showinfo('Default found for task',
                             'Default settings loaded for this task.')
-        if not data_dirpath:
-            data_dirpath = prefix + \
-                'MandanaResearch/OCD-FaceLearning/FaceLearning-Learning/'
-        get_block = True
-
-        cols = ['Subject', 'Block', 'Trial', 'TextDisplay6.RESP']
+    [default_dirpath, cols, sort_cols, get_block] = get_task_config(task,
+                                                                    prefix)
+    if not data_dirpath:
+        data_dirpath = default_dirpath
 
-        sort_cols = ['Subject', 'Block', 'Trial']
-
-    elif task == 'FaceLearning-Recall':
-        messagebox.showinfo('Default found for task',
-                            'Default settings loaded for this task.')
-        if not data_dirpath:
-            data_dirpath = prefix + \
-                'MandanaResearch/OCD-FaceLearning/FaceLearning-Recall/'
-        get_block = True
+    return data_dirpath, cols, sort_cols, task, get_block
 
-        cols = ['Subject', 'Block', 'Trial', 'CorrectAnswer',
-                'TextDisplay35.RESP', 'TextDisplay36.RESP']
 
-        sort_cols = ['Subject', 'Block', 'Trial']
-    elif task == 'FaceLearning':
-        messagebox.Message('Default found for task; default settings loaded')
-        if not data_dirpath:
-            data_dirpath = prefix + \
-                'MandanaResearch/OCD-FaceLearning/Output/'
-        get_block = False
+def read_recall_responses(recall_dirpath):
+    """ Read the typed recall responses needed by the face learning recall
+    task """
+    recall_cols = ['Subject', 'Block', 'Trial', 'Recall Choice',
+                   'Recog Choice']
+    file_name = sorted(glob.glob(path.join(recall_dirpath, '*.xlsx')))[0]
 
-    return data_dirpath, cols, sort_cols, task, get_block
+    return process_file(file_name, recall_cols, False)
 
 
-def process_dataframe(df, task, sort_cols, output_dirname, chosen_operations):
-    """ Process the data frame for additional calculated columns """
+def process_dataframe(df, task, sort_cols, output_dirname, chosen_operations,
+                      presorted=False):
+    """ Process the data frame for additional calculated columns. The sort
+    is skipped when the frame was already assembled in order """
 
     # initialize and leave empty if not reversal task
     reversals_df = pd.DataFrame({})
@@ -146,7 +312,7 @@ def process_dataframe(df, task, sort_cols, output_dirname, chosen_operations):
     avg_winshifts_df = pd.DataFrame({})
 
     # sort by the required identifying variables if specified
-    if sort_cols:
+    if sort_cols and not presorted:
         df.sort_values(sort_cols, inplace=True)
 
     # assign groups based on subject number
@@ -198,5 +364,131 @@ def process_dataframe(df, task, sort_cols, output_dirname, chosen_operations):
     return df, reversals_df, winshifts_df, avg_winshifts_df
 
 
+def group_frames(frames, task, sort_cols, recall_df=None):
+    """ Assemble the per-file data frames of a task in order and process
+    them, merging in the typed recall responses if given.
+
+    :return: the all data, reversals, winshifts and average winshifts frames
+    """
+    output_df = assemble_ordered(frames, sort_cols)
+    if recall_df is not None:
+        output_df = pd.merge(output_df, recall_df)
+
+    return process_dataframe(output_df, task, sort_cols, '', [],
+                             presorted=recall_df is None)
+
+
+def process_chunks(chunks, task, sort_cols, output_dirname,
+                   chosen_operations, excel_writer, merge_df=None):
+    """ Process ordered chunks of whole sessions one at a time, writing the
+    processed rows of each chunk to the 'All Data' sheet as they finish and
+    combining the reversals and winshifts results of all chunks.
+
+    :param chunks: iterable of data frames, each ordered by sort_cols
+    :param excel_writer: the excel writer for the output file, opened by
+        open_excel_writer with constant_memory so that written rows are not
+        kept in memory
+    :param merge_df: optional data frame merged into each chunk before
+        processing, e.g. the typed recall responses
+    :return: the combined reversals, winshifts and average winshifts frames
+    """
+    partials = []
+    start_row = 0
+
+    for chunk in chunks:
+        if merge_df is not None:
+            chunk = pd.merge(chunk, merge_df)
+        [chunk_df, reversals_df, winshifts_df, avg_winshifts_df] = \
+            process_dataframe(chunk, task, sort_cols, output_dirname,
+                              chosen_operations, presorted=merge_df is None)
+
+        # append the processed rows below those of the previous chunks
+        start_row = write_rows(excel_writer, 'All Data', chunk_df, start_row,
+                               header=not start_row)
+
+        partials.append((reversals_df, winshifts_df, avg_winshifts_df))
+
+    reversals_df = utils.combine_reversals([part[0] for part in partials])
+    winshifts_df, avg_winshifts_df = utils.combine_winshift_proportions(
+        [part[1] for part in partials], [part[2] for part in partials])
+
+    return reversals_df, winshifts_df, avg_winshifts_df
+
+
+def open_excel_writer(output_filename, constant_memory=False):
+    """ Create the excel writer for an output file. In constant_memory mode
+    each row is flushed to disk once a later row is written, so all sheets
+    must then be written row by row with write_sheet """
+    if constant_memory:
+        return pd.ExcelWriter(output_filename, engine='xlsxwriter',
+                              engine_kwargs={'options': {
+                                  'constant_memory': True}})
+
+    return pd.ExcelWriter(output_filename, engine='xlsxwriter')
+
+
+def write_rows(excel_writer, sheet_name, df, start_row=0, header=True):
+    """ Write a data frame to a sheet one row at a time, starting at
+    start_row, and return the row following the last one written.
+
+    Unlike to_excel, which writes column by column, this keeps to the row
+    order required by the constant_memory mode of xlsxwriter.
+    """
+    worksheet = excel_writer.book.get_worksheet_by_name(sheet_name)
+    if worksheet is None:
+        worksheet = excel_writer.book.add_worksheet(sheet_name)
+
+    if header:
+        worksheet.write_row(start_row, 0, [str(col) for col in df.columns])
+        start_row += 1
+
+    # empty cells are left blank, as with to_excel
+    values = df.astype(object).where(df.notna(), None).values.tolist()
+    for row in values:
+        worksheet.write_row(start_row, 0, row)
+        start_row += 1
+
+    return start_row
+
+
+def write_sheet(excel_writer, sheet_name, df, index=False,
+                constant_memory=False):
+    """ Write a data frame to a sheet of the output excel file, row by row
+    when the writer is in constant_memory mode. Index values are repeated
+    on every row rather than merged, so that the layout is the same in
+    both modes """
+    if not constant_memory:
+        df.to_excel(excel_writer, index=index, sheet_name=sheet_name,
+                    merge_cells=False)
+    elif index:
+        write_rows(excel_writer, sheet_name, df.reset_index())
+    else:
+        write_rows(excel_writer, sheet_name, df)
+
+
+def write_result_sheets(excel_writer, task, all_data_df=None,
+                        reversals_df=None, winshifts_df=None,
+                        winshifts_avg_df=None, summary_df=None, plot_df=None,
+                        constant_memory=False):
+    """ Format and write the result data frames of a task to the sheets of
+    the output excel file. The 'All Data' sheet is skipped when all_data_df
+    is None, e.g. when it was already written chunk by chunk """
+    if all_data_df is not None:
+        write_sheet(excel_writer, 'All Data', all_data_df,
+                    constant_memory=constant_memory)
+    if task == 'ActionValue' or task == 'Prob_RL':
+        write_sheet(excel_writer, 'Reversals', reversals_df,
+                    constant_memory=constant_memory)
+        write_sheet(excel_writer, 'Winshifts', winshifts_df,
+                    constant_memory=constant_memory)
+        write_sheet(excel_writer, 'Avg Winshifts', winshifts_avg_df,
+                    index=True, constant_memory=constant_memory)
+    if task == 'FaceLearning':
+        write_sheet(excel_writer, 'Analysis', summary_df,
+                    constant_memory=constant_memory)
+        write_sheet(excel_writer, 'Means', plot_df,
+                    constant_memory=constant_memory)
+
+
 if __name__ == '__main__':
     pass
@@ -0,0 +1,235 @@
+"""
+Data Grouper Sharded Execution
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains code for splitting a grouping operation over several
+machines or processes. Each shard processes a deterministic subset of
+the data directory and writes its partial results to a shared directory,
+after which a separate reduce step combines the partial results of all
+shards into the final output excel file.
+
+No coordination between shards is needed: each shard writes its results
+to a temporary directory that is renamed once complete, and the reduce
+step only starts once every shard directory is present.
+
+Usage:
+
+    python shard.py map TASK --index I --count N --shard-dir DIR
+        [--data-dir DIR] [--recall-dir DIR]
+    python shard.py reduce TASK --count N --shard-dir DIR --output FILE
+
+============================
+
+"""
+import argparse
+import glob
+import os
+import shutil
+import zlib
+from os import path
+import pandas as pd
+import manifest
+import processing
+import spill
+import utils
+
+
+# file names of the partial results written by each shard, by sheet
+PARTIAL_NAMES = {'All Data': 'all-data', 'Reversals': 'reversals',
+                 'Winshifts': 'winshifts', 'Avg Winshifts': 'avg-winshifts',
+                 'Analysis': 'analysis'}
+
+
+def shard_name(index, count):
+    """ Name of the directory holding the partial results of a shard """
+    return 'shard-{:05d}-of-{:05d}'.format(index, count)
+
+
+def in_shard(key, index, count):
+    """ Determine whether a file name or subject number belongs to the given
+    shard, using a hash that is the same on every machine """
+    return zlib.crc32(str(key).encode()) % count == index
+
+
+def map_shard(task, data_dirpath, shard_dirpath, index, count, prefix='',
+              recall_dirpath=None):
+    """ Process the subset of the data directory belonging to a shard and
+    write its partial results to the shard directory.
+
+    Data files are assigned to shards by their file name. For the
+    FaceLearning task, the merged recall and learning results are
+    assigned to shards by subject so that the measures of each block are
+    calculated from all of its trials.
+
+    :param task: name of the task to group
+    :param data_dirpath: the directory containing the data files
+    :param shard_dirpath: shared directory for the partial results
+    :param index: index of this shard, from 0 to count - 1
+    :param count: total number of shards
+    :param prefix: drive prefix of the default task directories
+    :param recall_dirpath: directory of the typed recall responses of the
+        FaceLearning-Recall task, if not the default one
+    :return: the directory the partial results were written to
+    """
+    [_, cols, sort_cols, get_block] = processing.get_task_config(task)
+    partials = {}
+
+    if task == 'FaceLearning':
+        all_data_df = utils.merge_facelearning(data_dirpath)
+        all_data_df = all_data_df[[in_shard(int(subject), index, count)
+                                   for subject in all_data_df['Subject']]]
+        partials['All Data'] = all_data_df
+        if len(all_data_df):
+            partials['Analysis'] = utils.calculate_facelearning_measures(
+                all_data_df)[0]
+    else:
+        file_manifest = manifest.DirectoryManifest(data_dirpath,
+                                                   get_block).update()
+        frames = [processing.process_file(
+                      file_manifest.path(file_name), cols, get_block,
+                      sort_cols, file_manifest.entries[file_name]['block'])
+                  for file_name in file_manifest.files
+                  if in_shard(file_name, index, count)]
+
+        if frames:
+            # recall in face learning task also needs the typed responses
+            recall_df = None
+            if task == 'FaceLearning-Recall':
+                recall_df = processing.read_recall_responses(
+                    recall_dirpath or
+                    prefix + processing.RECALL_RESPONSES_DIR)
+
+            [partials['All Data'], partials['Reversals'],
+             partials['Winshifts'], partials['Avg Winshifts']] = \
+                processing.group_frames(frames, task, sort_cols, recall_df)
+
+    # write to a temporary directory first so that a shard directory is
+    # only ever seen once all of its results are complete
+    final_dirpath = path.join(shard_dirpath, shard_name(index, count))
+    temp_dirpath = final_dirpath + '.tmp-{}'.format(os.getpid())
+    if path.isdir(temp_dirpath):
+        # left over from a crashed run that had the same process id
+        shutil.rmtree(temp_dirpath)
+    os.makedirs(temp_dirpath)
+    for sheet_name, df in partials.items():
+        spill.write_frame(df, path.join(temp_dirpath,
+                                        PARTIAL_NAMES[sheet_name]))
+
+    if path.isdir(final_dirpath):
+        shutil.rmtree(final_dirpath)
+    os.rename(temp_dirpath, final_dirpath)
+
+    return final_dirpath
+
+
+def read_partials(shard_dirpath, count, sheet_name):
+    """ Read the partial results for one sheet from every shard """
+    partials = []
+    for index in range(count):
+        for file_name in glob.glob(path.join(
+                shard_dirpath, shard_name(index, count),
+                PARTIAL_NAMES[sheet_name] + '.*')):
+            partials.append(spill.read_frame(file_name))
+
+    return partials
+
+
+def reduce_shards(task, shard_dirpath, count):
+    """ Combine the partial results of all shards into the result data
+    frames of the task.
+
+    :param task: name of the task that was grouped
+    :param shard_dirpath: shared directory holding the partial results
+    :param count: total number of shards
+    :return: a dict of the result data frames by sheet name
+    """
+    missing = [index for index in range(count) if not path.isdir(
+        path.join(shard_dirpath, shard_name(index, count)))]
+    if missing:
+        raise ValueError('Shards {} of {} have not finished.'.format(
+            missing, count))
+
+    [_, _, sort_cols, _] = processing.get_task_config(task)
+    results = {}
+
+    # order the trial rows of all shards, one subject and session at a time
+    all_data_dfs = [df for df in read_partials(shard_dirpath, count,
+                                               'All Data') if len(df)]
+    if sort_cols:
+        all_data_dfs = [group_df for df in all_data_dfs for _, group_df in
+                        df.groupby(sort_cols[:2], sort=False)]
+    results['All Data'] = processing.assemble_ordered(
+        all_data_dfs, sort_cols) if all_data_dfs else pd.DataFrame({})
+
+    if task == 'ActionValue' or task == 'Prob_RL':
+        results['Reversals'] = utils.combine_reversals(
+            read_partials(shard_dirpath, count, 'Reversals'))
+        results['Winshifts'], results['Avg Winshifts'] = \
+            utils.combine_winshift_proportions(
+                read_partials(shard_dirpath, count, 'Winshifts'),
+                read_partials(shard_dirpath, count, 'Avg Winshifts'))
+
+    if task == 'FaceLearning':
+        summary_dfs = read_partials(shard_dirpath, count, 'Analysis')
+        if summary_dfs:
+            summary_df = pd.concat(summary_dfs)
+            summary_df.sort_values(['Group', 'Subject', 'Block'],
+                                   inplace=True)
+            results['Analysis'] = summary_df
+            results['Means'] = utils.summarize_facelearning_means(summary_df)
+        else:
+            results['Analysis'] = results['Means'] = pd.DataFrame({})
+
+    return results
+
+
+def main():
+    """ Run the map or reduce step of a sharded grouping operation """
+    parser = argparse.ArgumentParser(description='Sharded grouping of the '
+                                                 'data files of a task.')
+    parser.add_argument('step', choices=['map', 'reduce'])
+    parser.add_argument('task', help='name of the task to group')
+    parser.add_argument('--count', type=int, required=True,
+                        help='total number of shards')
+    parser.add_argument('--index', type=int,
+                        help='index of the shard processed by the map step')
+    parser.add_argument('--shard-dir', required=True,
+                        help='shared directory for the partial results')
+    parser.add_argument('--data-dir', default=None,
+                        help='data directory, if not the default of the '
+                             'task')
+    parser.add_argument('--recall-dir', default=None,
+                        help='directory of the typed recall responses, if '
+                             'not the default one')
+    parser.add_argument('--output', help='output excel file of the reduce '
+                                         'step')
+    args = parser.parse_args()
+
+    prefix = processing.get_prefix()
+    if args.step == 'map':
+        if args.index is None or not 0 <= args.index < args.count:
+            parser.error('map requires --index between 0 and count - 1')
+        data_dirpath = args.data_dir or \
+            processing.get_task_config(args.task, prefix)[0]
+        print('Wrote ' + map_shard(args.task, data_dirpath, args.shard_dir,
+                                   args.index, args.count, prefix,
+                                   args.recall_dir))
+    else:
+        if not args.output:
+            parser.error('reduce requires --output')
+        results = reduce_shards(args.task, args.shard_dir, args.count)
+
+        excel_writer = pd.ExcelWriter(args.output, engine='xlsxwriter')
+        processing.write_result_sheets(
+            excel_writer, args.task, results['All Data'],
+            results.get('Reversals'), results.get('Winshifts'),
+            results.get('Avg Winshifts'), results.get('Analysis'),
+            results.get('Means'))
+        excel_writer.close()
+        print('Wrote ' + args.output)
+
+
+if __name__ == '__main__':
+    main()
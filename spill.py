@@ -0,0 +1,139 @@
+"""
+Data Grouper Spill Functions
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+This file contains code for keeping the memory used by grouper.py
+within a budget. Data frames read from the data files are accumulated
+in memory until the budget is exceeded, after which they are spilled
+to columnar temp files on local disk and read back in ordered chunks
+for the later processing stages.
+
+============================
+
+"""
+import shutil
+import tempfile
+from os import path
+import pandas as pd
+import processing
+
+
+class FrameSpiller:
+    """ Accumulate data frames in memory up to a memory budget, spilling
+    them to temp files on local disk once the budget is exceeded """
+
+    def __init__(self, budget_mb=None, temp_dir=None):
+
+        self.budget = budget_mb * 2 ** 20 if budget_mb else None
+        self.temp_dir = temp_dir
+        self.spill_dir = None
+
+        # each entry is [first key, last key, bytes, frame or spilled path]
+        self.entries = []
+        self.memory_bytes = 0
+
+    @property
+    def spilled(self):
+        """ Whether any frames have been spilled to disk """
+        return self.spill_dir is not None
+
+    @property
+    def frames(self):
+        """ The accumulated frames, when none have been spilled """
+        return [entry[3] for entry in self.entries]
+
+    def append(self, df, sort_cols):
+        """ Add a data frame, ordered by sort_cols, and spill the frames held
+        in memory once they use more than half of the memory budget, since
+        concatenating them briefly needs twice their memory """
+        keys = df[sort_cols]
+        first, last = (tuple(keys.iloc[0]), tuple(keys.iloc[-1])) \
+            if len(df) else ((), ())
+        num_bytes = int(df.memory_usage(deep=True).sum())
+
+        self.entries.append([first, last, num_bytes, df])
+        self.memory_bytes += num_bytes
+
+        if self.budget and self.memory_bytes > self.budget / 2:
+            self.spill()
+
+    def spill(self):
+        """ Write all frames held in memory to temp files """
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='datagrouper-',
+                                              dir=self.temp_dir)
+
+        for num, entry in enumerate(self.entries):
+            if isinstance(entry[3], pd.DataFrame):
+                entry[3] = write_frame(entry[3], path.join(
+                    self.spill_dir, 'frame-{}'.format(num)))
+        self.memory_bytes = 0
+
+    def iter_chunks(self, sort_cols):
+        """ Read the accumulated frames back in chunks of about a quarter of
+        the memory budget, each ordered by sort_cols, leaving room for the
+        copies made while processing a chunk.
+
+        Frames are ordered by their first key and chunks are only split
+        between frames whose key ranges do not overlap and that do not
+        share their leading two sort columns, e.g. (Subject, Session), so
+        that every session is processed within a single chunk.
+        """
+        chunk_budget = self.budget / 4 if self.budget else None
+        entries = sorted(self.entries, key=lambda entry: entry[0])
+
+        chunk = []
+        chunk_bytes = 0
+        last_key = None
+        for first, last, num_bytes, frame in entries:
+            # close the current chunk once it is full and may be split here
+            if chunk and chunk_budget and chunk_bytes + num_bytes > \
+                    chunk_budget and first >= last_key and \
+                    (not sort_cols or first[:2] != last_key[:2]):
+                yield processing.assemble_ordered(
+                    [read_frame(frame) for frame in chunk], sort_cols)
+                chunk, chunk_bytes = [], 0
+
+            chunk.append(frame)
+            chunk_bytes += num_bytes
+            last_key = last if last_key is None else max(last_key, last)
+
+        if chunk:
+            yield processing.assemble_ordered(
+                [read_frame(frame) for frame in chunk], sort_cols)
+
+    def close(self):
+        """ Remove any temp files that were spilled to disk """
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+        self.entries = []
+        self.memory_bytes = 0
+
+
+def write_frame(df, file_stem):
+    """ Write a data frame to a parquet file, falling back to a pickle file
+    when parquet is unavailable or cannot store the columns, e.g. mixed or
+    unsupported types, and return the path written """
+    try:
+        df.to_parquet(file_stem + '.parquet')
+        return file_stem + '.parquet'
+    except (ImportError, NotImplementedError, TypeError, ValueError):
+        df.to_pickle(file_stem + '.pkl')
+        return file_stem + '.pkl'
+
+
+def read_frame(frame):
+    """ Return a data frame that is held in memory or was spilled to disk """
+    if isinstance(frame, pd.DataFrame):
+        return frame
+    if frame.endswith('.parquet'):
+        return pd.read_parquet(frame)
+
+    return pd.read_pickle(frame)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,114 @@
+"""
+Data Grouper cache tests
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+Tests for keying, storing, restoring and evicting cached results.
+
+============================
+
+"""
+import os
+import time
+import pytest
+import cache
+
+
+TASK_CONFIG = {'task': 'ActionValue', 'cols': ['Subject', 'WinLose'],
+               'sort_cols': ['Subject', 'Session'], 'get_block': False}
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    """ A small input file with a fixed modification time """
+    file_path = tmp_path / 'ActionValue-401-1.xlsx'
+    file_path.write_bytes(b'data')
+    os.utime(file_path, (1000000000, 1000000000))
+
+    return file_path
+
+
+def test_make_key_changes_with_inputs_task_and_code(input_file,
+                                                    monkeypatch):
+    key = cache.make_key([str(input_file)], TASK_CONFIG)
+    assert cache.make_key([str(input_file)], dict(TASK_CONFIG)) == key
+
+    # a changed modification time
+    os.utime(input_file, (1000000001, 1000000001))
+    mtime_key = cache.make_key([str(input_file)], TASK_CONFIG)
+    assert mtime_key != key
+
+    # a changed size with the same modification time
+    input_file.write_bytes(b'more data')
+    os.utime(input_file, (1000000001, 1000000001))
+    size_key = cache.make_key([str(input_file)], TASK_CONFIG)
+    assert size_key not in {key, mtime_key}
+
+    # a changed task definition
+    task_key = cache.make_key([str(input_file)],
+                              dict(TASK_CONFIG, cols=['Subject']))
+    assert task_key not in {key, mtime_key, size_key}
+
+    # a changed version of the code
+    monkeypatch.setattr(cache, 'code_version', lambda: 'other version')
+    assert cache.make_key([str(input_file)], TASK_CONFIG) not in \
+        {key, mtime_key, size_key, task_key}
+
+
+def write_entry(result_cache, key, size, used_time):
+    """ Write a cache entry of the given size, last used at used_time """
+    os.makedirs(result_cache.cache_dir, exist_ok=True)
+    entry_path = result_cache.entry_path(key, '.xlsx')
+    with open(entry_path, 'wb') as entry_file:
+        entry_file.write(b'x' * size)
+    os.utime(entry_path, (used_time, used_time))
+
+    return entry_path
+
+
+def test_evict_removes_entries_past_max_age(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path), max_age_days=1)
+    now = time.time()
+    old = write_entry(result_cache, 'old', 10, now - 2 * 24 * 60 * 60)
+    new = write_entry(result_cache, 'new', 10, now - 60)
+    result_cache.evict()
+
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+
+
+def test_evict_removes_least_recently_used_beyond_max_size(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path), max_size_mb=1)
+    now = time.time()
+    entries = [write_entry(result_cache, 'entry-{}'.format(num),
+                           400 * 2 ** 10, now - 60 * (5 - num))
+               for num in range(5)]
+    result_cache.evict()
+
+    # only the two most recently used entries fit in 1 MB
+    assert [os.path.exists(entry) for entry in entries] == \
+        [False, False, False, True, True]
+
+
+def test_restore_workbook_publishes_atomically(tmp_path):
+    result_cache = cache.ResultCache(str(tmp_path / 'cache'))
+    local_filename = tmp_path / 'local.xlsx'
+    local_filename.write_bytes(b'cached workbook')
+    result_cache.store_workbook('key', str(local_filename))
+    assert os.listdir(tmp_path / 'cache') == ['key.xlsx']
+
+    output_dir = tmp_path / 'Output'
+    temp_dir = tmp_path / 'temp'
+    output_dir.mkdir()
+    temp_dir.mkdir()
+    (output_dir / 'result.xlsx').write_bytes(b'old workbook')
+
+    assert result_cache.restore_workbook('key', str(output_dir /
+                                                    'result.xlsx'),
+                                         str(temp_dir))
+    assert (output_dir / 'result.xlsx').read_bytes() == b'cached workbook'
+    assert os.listdir(output_dir) == ['result.xlsx']
+    assert os.listdir(temp_dir) == []
+    assert not result_cache.restore_workbook('other key',
+                                             str(output_dir / 'other.xlsx'))
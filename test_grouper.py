@@ -0,0 +1,96 @@
+"""
+Data Grouper main program tests
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+Tests that run grouper.py from start to finish with its dialogs replaced,
+writing, publishing and caching the output excel file.
+
+============================
+
+"""
+import os
+import sys
+import pandas as pd
+import pytest
+import grouper
+import processing
+
+
+class FakeTk:
+    """ Stand-in for the tk root window, which needs a display """
+
+    def withdraw(self):
+        pass
+
+
+@pytest.fixture
+def run_main(actionvalue_dir, tmp_path, monkeypatch):
+    """ Run grouper.main on the ActionValue data directory without dialogs,
+    returning the output and temp directories """
+    output_dir = tmp_path / 'Output'
+    temp_dir = tmp_path / 'temp'
+    output_dir.mkdir()
+    temp_dir.mkdir()
+
+    [_, cols, sort_cols, get_block] = processing.get_task_config(
+        'ActionValue')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(grouper, 'Tk', FakeTk)
+    monkeypatch.setattr(grouper.messagebox, 'showwarning',
+                        lambda *args: None)
+    monkeypatch.setattr(processing, 'determine_task',
+                        lambda *args: (str(actionvalue_dir), cols, sort_cols,
+                                       'ActionValue', get_block))
+    monkeypatch.setattr(processing, 'get_directory',
+                        lambda *args: str(output_dir))
+
+    def run(*options):
+        monkeypatch.setattr(sys, 'argv', [
+            'grouper.py', 'ActionValue', '--temp-dir', str(temp_dir),
+            '--cache-dir', str(tmp_path / 'cache')] + list(options))
+        grouper.main()
+
+        return output_dir, temp_dir
+
+    return run
+
+
+def test_main_publishes_and_caches_output(run_main):
+    output_dir, temp_dir = run_main()
+
+    [output_file] = os.listdir(output_dir)
+    sheets = pd.read_excel(output_dir / output_file, sheet_name=None)
+    assert list(sheets) == ['All Data', 'Reversals', 'Winshifts',
+                            'Avg Winshifts']
+    assert len(sheets['All Data']) == 464
+    assert os.listdir(temp_dir) == []
+
+    # a second run over the same inputs restores the cached output
+    os.remove(output_dir / output_file)
+    run_main()
+    assert os.listdir(output_dir) == [output_file]
+    assert os.listdir(temp_dir) == []
+    pd.testing.assert_frame_equal(
+        pd.read_excel(output_dir / output_file, sheet_name='All Data'),
+        sheets['All Data'])
+
+
+def test_main_writes_spilled_output(run_main):
+    output_dir, temp_dir = run_main('--memory-budget', '0.02', '--no-cache')
+
+    [output_file] = os.listdir(output_dir)
+    sheets = pd.read_excel(output_dir / output_file, sheet_name=None)
+    assert len(sheets['All Data']) == 464
+    assert os.listdir(temp_dir) == []
+
+
+def test_main_preview_writes_report(run_main):
+    output_dir, temp_dir = run_main('--preview', '--per-group', '1')
+
+    [output_file] = os.listdir(output_dir)
+    assert output_file.endswith('-PREVIEW.xlsx')
+    sheets = pd.read_excel(output_dir / output_file, sheet_name=None)
+    assert 'Preview' in sheets
+    assert set(sheets['Preview']['Files']) == {'3 of 16'}
@@ -0,0 +1,85 @@
+"""
+Data Grouper manifest tests
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+Tests for indexing the excel files of a data directory.
+
+============================
+
+"""
+import shutil
+import pandas as pd
+import manifest
+import processing
+
+
+def test_parse_file_name_requires_task_subject_session():
+    assert manifest.parse_file_name('ActionValue-401-1.xlsx') == \
+        {'subject': 401, 'session': 1, 'block': None}
+    assert manifest.parse_file_name('ActionValue-401-1-2017.xlsx')[
+        'subject'] is None
+    assert manifest.parse_file_name('ActionValue-401.xlsx')[
+        'subject'] is None
+
+
+def test_update_skips_hidden_files_and_hashes_only_candidates(
+        actionvalue_dir):
+    shutil.copyfile(actionvalue_dir / 'ActionValue-401-1.xlsx',
+                    actionvalue_dir / '._ActionValue-401-1.xlsx')
+    shutil.copyfile(actionvalue_dir / 'ActionValue-401-1.xlsx',
+                    actionvalue_dir / 'ActionValue-401-1-copy.xlsx')
+
+    file_manifest = manifest.DirectoryManifest(actionvalue_dir).update()
+
+    assert '._ActionValue-401-1.xlsx' not in file_manifest.files
+    assert ['ActionValue-401-1-copy.xlsx', 'ActionValue-401-1.xlsx'] in \
+        file_manifest.duplicates()
+    hashed = {file_name for file_name in file_manifest.files
+              if file_manifest.entries[file_name]['hash'] is not None}
+    sizes = [file_manifest.entries[file_name]['size']
+             for file_name in file_manifest.files]
+    assert hashed == {file_name for file_name in file_manifest.files
+                      if sizes.count(
+                          file_manifest.entries[file_name]['size']) > 1}
+
+
+def test_header_index_is_stored_in_manifest(actionvalue_dir):
+    file_manifest = manifest.DirectoryManifest(actionvalue_dir).update()
+    col_files = processing.build_header_index(file_manifest,
+                                              file_manifest.files)
+
+    assert col_files['WinLose'] == file_manifest.files
+    reloaded = manifest.DirectoryManifest(actionvalue_dir).update()
+    assert all(reloaded.entries[file_name]['cols'] == list(col_files)
+               for file_name in reloaded.files)
+
+
+def test_block_names_give_subject_and_conflicts(tmp_path):
+    for suffix, trials in [('a', 3), ('b', 4)]:
+        pd.DataFrame({'Subject': 401, 'Trial': range(trials)}).to_excel(
+            tmp_path / 'FaceLearning-401-Block1_{}.xlsx'.format(suffix),
+            index=False)
+
+    assert manifest.parse_file_name('FaceLearning-401-Block1_a.xlsx',
+                                    get_block=True) == \
+        {'subject': 401, 'session': None, 'block': 1}
+    file_manifest = manifest.DirectoryManifest(tmp_path, True).update()
+    assert file_manifest.conflicts() == [['FaceLearning-401-Block1_a.xlsx',
+                                          'FaceLearning-401-Block1_b.xlsx']]
+
+
+def test_subject_is_read_once_for_unparsed_names(actionvalue_dir,
+                                                 monkeypatch):
+    shutil.copyfile(actionvalue_dir / 'ActionValue-402-2.xlsx',
+                    actionvalue_dir / 'ActionValue-402-2-2017.xlsx')
+    file_manifest = manifest.DirectoryManifest(actionvalue_dir).update()
+    assert file_manifest.entries['ActionValue-402-2-2017.xlsx'][
+        'subject'] == 402
+    assert file_manifest.conflicts() == []
+
+    # later runs take the subject from the manifest
+    monkeypatch.setattr(processing, 'read_subject', None)
+    reloaded = manifest.DirectoryManifest(actionvalue_dir).update()
+    assert reloaded.entries['ActionValue-402-2-2017.xlsx']['subject'] == 402
@@ -0,0 +1,98 @@
+"""
+Data Grouper prefetch tests
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+Tests for reading data files ahead and publishing output files.
+
+============================
+
+"""
+import os
+import pytest
+import prefetch
+
+
+@pytest.fixture
+def data_files(tmp_path):
+    """ Ten small files, each holding its own index """
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    file_paths = []
+    for index in range(10):
+        file_path = data_dir / 'file-{}.dat'.format(index)
+        file_path.write_bytes(str(index).encode())
+        file_paths.append(str(file_path))
+
+    return file_paths
+
+
+def test_buffers_come_back_in_input_order(data_files):
+    prefetcher = prefetch.Prefetcher(data_files, max_buffered=2)
+    items = [(file_path, source.read(), source.name)
+             for file_path, source in prefetcher]
+    prefetcher.close()
+
+    assert items == [(file_path, str(index).encode(), file_path)
+                     for index, file_path in enumerate(data_files)]
+
+
+def test_staged_copies_are_removed(data_files, tmp_path):
+    prefetcher = prefetch.Prefetcher(data_files, max_buffered=2,
+                                     staging_dir=str(tmp_path))
+    staged = []
+    for index, (file_path, source) in enumerate(prefetcher):
+        with open(source, 'rb') as staged_file:
+            assert staged_file.read() == str(index).encode()
+
+        # the copy of the previous file is removed once the next is taken
+        assert all(not os.path.exists(path) for path in staged)
+        staged.append(source)
+    prefetcher.close()
+
+    assert not os.path.exists(prefetcher.staging_dir)
+    assert [item.name for item in tmp_path.iterdir()] == ['data']
+
+
+def test_staging_dir_is_removed_when_consumer_raises(data_files, tmp_path):
+    prefetcher = prefetch.Prefetcher(data_files, max_buffered=2,
+                                     staging_dir=str(tmp_path))
+    with pytest.raises(RuntimeError):
+        try:
+            for index, _ in enumerate(prefetcher):
+                if index == 3:
+                    raise RuntimeError('parsing failed')
+        finally:
+            prefetcher.close()
+
+    assert not prefetcher.thread.is_alive()
+    assert [item.name for item in tmp_path.iterdir()] == ['data']
+
+
+def test_reader_error_reaches_consumer(data_files):
+    prefetcher = prefetch.Prefetcher(data_files[:2] + ['missing.dat'])
+    file_paths = []
+    with pytest.raises(FileNotFoundError):
+        for file_path, _ in prefetcher:
+            file_paths.append(file_path)
+    prefetcher.close()
+
+    assert file_paths == data_files[:2]
+
+
+def test_publish_file_leaves_no_temp_or_local_file(tmp_path):
+    output_dir = tmp_path / 'Output'
+    output_dir.mkdir()
+    output_filename = str(output_dir / 'result.xlsx')
+    (output_dir / 'result.xlsx').write_bytes(b'old')
+
+    local_filename = prefetch.local_output_path(output_filename,
+                                                str(tmp_path))
+    with open(local_filename, 'wb') as local_file:
+        local_file.write(b'new')
+    prefetch.publish_file(local_filename, output_filename)
+
+    assert (output_dir / 'result.xlsx').read_bytes() == b'new'
+    assert os.listdir(output_dir) == ['result.xlsx']
+    assert not os.path.exists(local_filename)
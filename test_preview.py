@@ -0,0 +1,69 @@
+"""
+Data Grouper preview tests
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+Tests for sampling the data files of a preview and extrapolating the
+cost of a full run.
+
+============================
+
+"""
+import pandas as pd
+import pytest
+import manifest
+import preview
+import processing
+
+
+def test_sample_files_takes_even_spread_from_each_group(actionvalue_dir,
+                                                        monkeypatch):
+    file_manifest = manifest.DirectoryManifest(actionvalue_dir).update()
+    all_files = file_manifest.files
+
+    # the subjects come from the manifest, without reading any file
+    monkeypatch.setattr(processing, 'read_subject', None)
+    sampled = preview.sample_files(
+        [file_manifest.path(file_name) for file_name in all_files],
+        'ActionValue', per_group=2, file_manifest=file_manifest)
+
+    # control 401-403, sham 751 and 753, treatment 752, 754 and 756
+    assert [file_path.split('/')[-1] for file_path in sampled] == [
+        'ActionValue-401-1.xlsx', 'ActionValue-402-2.xlsx',
+        'ActionValue-751-1.xlsx', 'ActionValue-752-1.xlsx',
+        'ActionValue-753-1.xlsx', 'ActionValue-754-2.xlsx']
+
+
+def test_sample_files_takes_whole_small_groups(actionvalue_dir):
+    all_files = sorted(str(file_path) for file_path in
+                       actionvalue_dir.glob('*.xlsx'))
+
+    assert preview.sample_files(all_files, 'ActionValue',
+                                per_group=10) == all_files
+
+
+def test_per_group_must_be_positive():
+    with pytest.raises(SystemExit):
+        processing.parse_arguments(['ActionValue', '--preview',
+                                    '--per-group', '0'])
+
+
+def test_report_extrapolates_to_full_run():
+    report = preview.PreviewReport(2, 10)
+    report.stage_times = {'Read files': 1.0, 'Process': 3.0}
+    report.add_io(2.0, 0.5)
+    report.add_frame(pd.DataFrame({'Value': range(2 ** 17)}))
+    report_df = report.to_dataframe().set_index('Measure')
+
+    assert list(report_df.loc['Total (s)', ['Preview', 'Per File',
+                                            'Estimated Full Run']]) == \
+        [4.0, 2.0, 20.0]
+    assert report_df.loc['I/O wait saved (s)', 'Estimated Full Run'] == 7.5
+
+    # every memory figure allows for the frames being copied once
+    megabytes = 2 * report.frame_bytes / 2 ** 20
+    assert list(report_df.loc['Peak memory (MB)', [
+        'Preview', 'Per File', 'Estimated Full Run']]) == \
+        [megabytes, megabytes / 2, megabytes * 5]
+    assert set(report_df['Files']) == {'2 of 10'}
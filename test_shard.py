@@ -0,0 +1,70 @@
+"""
+Data Grouper shard tests
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+Tests that combining the partial results of several shard processes
+gives the same results as grouping all of the data files in one run.
+
+============================
+
+"""
+import os
+import subprocess
+import sys
+from os import path
+import pandas as pd
+import api
+import shard
+
+
+SHARD_SCRIPT = path.join(path.dirname(path.abspath(__file__)), 'shard.py')
+
+
+def test_sharded_results_equal_single_run(actionvalue_dir, tmp_path):
+    task = 'ActionValue'
+    count = 3
+    shard_dir = tmp_path / 'shards'
+
+    # run the map step of every shard in its own process
+    processes = [subprocess.Popen(
+        [sys.executable, SHARD_SCRIPT, 'map', task, '--index', str(index),
+         '--count', str(count), '--shard-dir', str(shard_dir),
+         '--data-dir', str(actionvalue_dir)])
+        for index in range(count)]
+    assert all(process.wait() == 0 for process in processes)
+
+    sharded = shard.reduce_shards(task, str(shard_dir), count)
+    single = api.run_task(task, sorted(str(file_path) for file_path in
+                                       actionvalue_dir.glob('*.xlsx')))
+
+    assert sorted(sharded) == sorted(single)
+    for sheet_name in ['All Data', 'Reversals', 'Winshifts']:
+        pd.testing.assert_frame_equal(
+            sharded[sheet_name].reset_index(drop=True),
+            single[sheet_name].reset_index(drop=True), check_dtype=False)
+    pd.testing.assert_frame_equal(sharded['Avg Winshifts'],
+                                  single['Avg Winshifts'], check_dtype=False)
+
+
+def test_reduce_without_facelearning_partials(tmp_path):
+    for index in range(2):
+        (tmp_path / shard.shard_name(index, 2)).mkdir()
+
+    results = shard.reduce_shards('FaceLearning', str(tmp_path), 2)
+    assert all(results[sheet_name].empty
+               for sheet_name in ['All Data', 'Analysis', 'Means'])
+
+
+def test_map_replaces_leftover_temp_dir(actionvalue_dir, tmp_path):
+    shard_dir = tmp_path / 'shards'
+    leftover = shard_dir / (shard.shard_name(0, 1) +
+                            '.tmp-{}'.format(os.getpid()))
+    leftover.mkdir(parents=True)
+    (leftover / 'stale.pkl').write_bytes(b'stale')
+
+    final_dirpath = shard.map_shard('ActionValue', str(actionvalue_dir),
+                                    str(shard_dir), 0, 1)
+    assert os.listdir(shard_dir) == [shard.shard_name(0, 1)]
+    assert 'stale.pkl' not in os.listdir(final_dirpath)
@@ -0,0 +1,85 @@
+"""
+Data Grouper spill tests
+============================
+Created by: Chris Cadonic
+For: Utility in Dr. Mandana Modirrousta's Lab
+----------------------------
+Tests that processing data spilled to disk in chunks gives the same
+output as processing all of the data in memory.
+
+============================
+
+"""
+import pandas as pd
+import processing
+import spill
+
+
+def read_frames(data_dir, task):
+    """ Read the data files of a task as grouper.py does """
+    [_, cols, sort_cols, get_block] = processing.get_task_config(task)
+
+    return [processing.process_file(str(file_path), cols, get_block,
+                                    sort_cols)
+            for file_path in sorted(data_dir.glob('*.xlsx'))], sort_cols
+
+
+def test_chunked_output_equals_unchunked(actionvalue_dir, tmp_path):
+    task = 'ActionValue'
+    frames, sort_cols = read_frames(actionvalue_dir, task)
+
+    # process everything in memory
+    [all_data_df, reversals_df, winshifts_df, winshifts_avg_df] = \
+        processing.group_frames(frames, task, sort_cols)
+    excel_writer = processing.open_excel_writer(tmp_path / 'memory.xlsx')
+    processing.write_result_sheets(excel_writer, task, all_data_df,
+                                   reversals_df, winshifts_df,
+                                   winshifts_avg_df)
+    excel_writer.close()
+
+    # spill to disk under a small memory budget and process in chunks
+    spiller = spill.FrameSpiller(0.02, tmp_path)
+    for df in frames:
+        spiller.append(df, sort_cols)
+    assert spiller.spilled
+    assert len(list(spiller.iter_chunks(sort_cols))) > 1
+
+    excel_writer = processing.open_excel_writer(tmp_path / 'chunked.xlsx',
+                                                constant_memory=True)
+    [chunked_reversals_df, chunked_winshifts_df, chunked_avg_df] = \
+        processing.process_chunks(spiller.iter_chunks(sort_cols), task,
+                                  sort_cols, '', [], excel_writer)
+    processing.write_result_sheets(excel_writer, task, None,
+                                   chunked_reversals_df, chunked_winshifts_df,
+                                   chunked_avg_df, constant_memory=True)
+    excel_writer.close()
+    spiller.close()
+
+    pd.testing.assert_frame_equal(
+        chunked_reversals_df.reset_index(drop=True),
+        reversals_df.reset_index(drop=True), check_dtype=False)
+    pd.testing.assert_frame_equal(
+        chunked_winshifts_df.reset_index(drop=True),
+        winshifts_df.reset_index(drop=True), check_dtype=False)
+    pd.testing.assert_frame_equal(chunked_avg_df, winshifts_avg_df,
+                                  check_dtype=False)
+
+    # the written sheets hold the same values
+    memory_sheets = pd.read_excel(tmp_path / 'memory.xlsx', sheet_name=None)
+    chunked_sheets = pd.read_excel(tmp_path / 'chunked.xlsx', sheet_name=None)
+    assert list(chunked_sheets) == list(memory_sheets)
+    for sheet_name in memory_sheets:
+        pd.testing.assert_frame_equal(chunked_sheets[sheet_name],
+                                      memory_sheets[sheet_name],
+                                      check_dtype=False)
+    pd.testing.assert_frame_equal(
+        memory_sheets['Avg Winshifts'],
+        winshifts_avg_df.reset_index(), check_dtype=False)
+
+
+def test_write_frame_falls_back_to_pickle(tmp_path):
+    df = pd.DataFrame({'Value': [1 + 2j, 3 - 4j]})
+    file_name = spill.write_frame(df, str(tmp_path / 'frame'))
+
+    assert file_name.endswith('.pkl')
+    pd.testing.assert_frame_equal(spill.read_frame(file_name), df)
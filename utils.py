@@ -18,10 +18,15 @@ switch by changing sides after choosing a winning option
 """
 import numpy as np
 import pandas as pd
+from os import path
 from itertools import permutations
-from tkinter import messagebox
 
 
+# output excels of the recall and learning tasks, which are merged for the
+# face learning task
+FACELEARNING_OUTPUTS = ['FaceLearning-Recall-Output.xlsx',
+                        'FaceLearning-Learning-Output.xlsx']
+
 def gkgamma(m, n):
     """
     From sample calculations of the goodman kruskal gamma calculation, 
@@ -64,7 +69,12 @@ def determine_error_switches(df, task):
     conditions = list(df['Condition'])
     wins = list(df['WinLose'])
     indices = list(df.index.values)
+
+    # a switch is never counted across sessions, so that each session can be
+    # processed on its own, e.g. in chunks or shards
+    sessions = list(zip(df['Subject'], df['Session']))
     error_switch = [1 if ((wins[cur - 1] == 'win')
+                    and (sessions[cur] == sessions[cur - 1])
                     and (choice_made[cur] != choice_made[cur - 1])
                     and (not (indices[cur] == 6 and indices[cur - 1] > 6))
                     and (indices[cur] != 0)
@@ -130,7 +140,7 @@ def determine_max_reversals(df, project):
 
     # collapse over subject and session
     reversals_df.drop_duplicates(inplace=True)
-    reversals_df.sort_values('Group', inplace=True)
+    reversals_df.sort_values('Group', inplace=True, kind='mergesort')
 
     return reversals_df
 
@@ -143,8 +153,9 @@ def determine_winshift_proportions(df):
     grouper = df.groupby(['Subject', 'Session'])
     df['winshifts'] = grouper['Error Switch'].transform('sum')
 
-    # create two columns for use in calculating total win follow-ups
-    df['shifted winlose'] = df['WinLose'].shift(1)
+    # create two columns for use in calculating total win follow-ups, only
+    # following up on trials from the same session
+    df['shifted winlose'] = grouper['WinLose'].shift(1)
     df['win followup'] = np.where(df['shifted winlose'] == 'win', 1, 0)
 
     df['num followups'] = df.groupby(['Subject', 'Session'])['win ' \
@@ -160,7 +171,7 @@ def determine_winshift_proportions(df):
 
     # collapse over subject and session
     winshifts.drop_duplicates(inplace=True)
-    winshifts.sort_values('Group', inplace=True)
+    winshifts.sort_values('Group', inplace=True, kind='mergesort')
 
     ''' winshift averages '''
     # determine how many trials followed win feedback for each session
@@ -169,13 +180,55 @@ def determine_winshift_proportions(df):
     winshift_all = grouper['win followup'].sum().to_frame('num followups')
 
     # combine the two Series' into a new output frame for winshifts
-    winshifts_avg = pd.concat([winshift_errors, winshift_all], 1)
+    winshifts_avg = pd.concat([winshift_errors, winshift_all], axis=1)
 
     winshifts_avg['Mean Proportion'] = winshifts_avg['winshifts']/\
                                    winshifts_avg['num followups']
 
     # remove temporary columns
-    df.drop(['shifted winlose', 'win followup'], 1, inplace=True)
+    df.drop(['shifted winlose', 'win followup'], axis=1, inplace=True)
+
+    return winshifts, winshifts_avg
+
+
+def combine_reversals(partial_dfs):
+    """ Combine reversals data frames that were determined separately for
+    parts of the data into a single reversals data frame """
+
+    partial_dfs = [df for df in partial_dfs if not df.empty]
+    if not partial_dfs:
+        return pd.DataFrame({})
+
+    # a session split over several parts keeps its maximum reversal
+    reversals_df = pd.concat(partial_dfs).groupby(
+        ['Subject', 'Session', 'Group'], as_index=False)['Num Reversals'].max()
+    reversals_df.sort_values('Group', inplace=True, kind='mergesort')
+
+    return reversals_df
+
+def combine_winshift_proportions(partial_winshifts, partial_avgs):
+    """ Combine winshifts and winshift averages data frames that were
+    determined separately for parts of the data, summing the winshift and
+    follow-up counts before recalculating the proportions """
+
+    partial_winshifts = [df for df in partial_winshifts if not df.empty]
+    partial_avgs = [df for df in partial_avgs if not df.empty]
+    if not partial_winshifts:
+        return pd.DataFrame({}), pd.DataFrame({})
+
+    ''' winshifts all data '''
+    winshifts = pd.concat(partial_winshifts).groupby(
+        ['Subject', 'Session', 'Group'], as_index=False)[
+        ['winshifts', 'num followups']].sum()
+    winshifts['Winshift Proportions'] = winshifts['winshifts']/winshifts[
+        'num followups']
+    winshifts.sort_values('Group', inplace=True, kind='mergesort')
+
+    ''' winshift averages '''
+    winshifts_avg = pd.concat(partial_avgs).groupby(level=[0, 1])[
+        ['winshifts', 'num followups']].sum()
+    winshifts_avg['Mean Proportion'] = winshifts_avg['winshifts']/\
+                                   winshifts_avg['num followups']
 
     return winshifts, winshifts_avg
 
@@ -218,25 +271,30 @@ def merge_facelearning(data_dirname):
     #initialization
     datafiles = []
 
-    files = ['FaceLearning-Recall-Output.xlsx',
-             'FaceLearning-Learning-Output.xlsx']
-
-    for file_name in files:
+    for file_name in FACELEARNING_OUTPUTS:
         try:
             # setup the excel file
-            excel = pd.ExcelFile(file_name)
+            excel = pd.ExcelFile(path.join(data_dirname, file_name))
 
             # now read excel file data into a DataFrame
             datafile = pd.read_excel(excel)
 
             datafiles.append(datafile)
         except:
+            # only imported here so that utils can be used without a display
+            from tkinter import messagebox
             messagebox.showwarning("Error in loading excel; check to make "
                                 "sure the other face learning excel files " 
                                 "have been output already.")
             return
 
-    return pd.merge(datafiles[0], datafiles[1])
+    return merge_facelearning_frames(datafiles[0], datafiles[1])
+
+def merge_facelearning_frames(recall_df, learning_df):
+    """ Merge the face learning recall and learning results, whether read
+    from their output excels or produced in memory """
+
+    return pd.merge(recall_df, learning_df)
 
 def calculate_facelearning_measures(all_data_df):
     """ Calculate mean performance statistics and JOL, RCJ and FOK measures
@@ -287,6 +345,14 @@ def calculate_facelearning_measures(all_data_df):
     summary_df['FOK'] = fok
     summary_df.sort_values(['Group', 'Subject', 'Block'], inplace=True)
 
+    plot_df = summarize_facelearning_means(summary_df)
+
+    return summary_df, plot_df
+
+def summarize_facelearning_means(summary_df):
+    """ Calculate the mean of each face learning measure for every group
+    from the block measures of all subjects """
+
     # aggregate plot_df for summarizing means
     plot_grouper = summary_df.groupby(['Group'])
     new_df = plot_grouper[['Recall Corr', 'Recog Corr', 'JOL',
@@ -297,7 +363,7 @@ def calculate_facelearning_measures(all_data_df):
 
     plot_df = new_df[cols].drop_duplicates()
 
-    return summary_df, plot_df
+    return plot_df
 
 
 if __name__ == '__main__':